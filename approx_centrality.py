@@ -0,0 +1,235 @@
+import argparse
+import math
+import os
+from collections import namedtuple
+from statistics import NormalDist
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.sparse.csgraph import dijkstra
+
+from graph_store import load_csr
+
+# approx_centrality.py
+# Betweenness and closeness estimated from a sample of pivot (source) vertices
+# instead of all of them (Brandes & Pich 2007; Eppstein & Wang 2004 for closeness).
+# Every pivot gets one shortest-path search and Brandes' dependency accumulation;
+# the sum over k of n pivots, scaled by n / k, is unbiased, and with k = n it is
+# exact. Pivots are processed in batches, each batch as one block-diagonal
+# shortest-path DAG so path counts and dependencies are sparse products, and the
+# batches are spread over processes that map the CSR store. Sample sizes come
+# either from a budget or from an (epsilon, delta) bound: by Hoeffding's inequality
+# and a union bound over the vertices, ln(2n / delta) / (2 epsilon^2) pivots put
+# every normalised betweenness within about epsilon of the exact value with
+# probability 1 - delta. Per-vertex betweenness intervals are empirical Bernstein
+# bounds (Maurer & Pontil 2009), which stay honest for vertices that no sampled
+# pivot happened to pass through; closeness intervals use the normal
+# approximation. Both shrink to zero as k reaches n.
+
+
+EDGE_FILE = "coretweet_edges.csv"
+DELTA = 0.1
+CONFIDENCE = 0.95
+BATCH_ENTRIES = 1 << 22  # distance-matrix entries per batch of pivots
+TOLERANCE = 1e-9  # relative, for equal-length paths under float distances
+
+Centrality = namedtuple("Centrality", ["ids", "betweenness", "betweenness_error", "closeness",
+                                       "closeness_error", "samples"])
+
+
+def sample_size(n, epsilon, delta=DELTA):
+    # Pivots needed for every normalised betweenness to be within epsilon w.p. 1 - delta
+    return min(n, math.ceil(math.log(2 * n / delta) / (2 * epsilon ** 2)))
+
+
+def init_worker(path):
+    # Each worker maps the CSR store once
+    global _graph, _rows, _lengths
+    _graph = load_csr(path)
+    _rows = np.repeat(np.arange(len(_graph.ids)), np.diff(_graph.indptr))
+    _lengths = {}
+
+
+def _length_matrix(distance):
+    # Edge lengths: 1 / weight with distance=True, one hop otherwise
+    if distance not in _lengths:
+        n = len(_graph.ids)
+        indptr, indices = np.asarray(_graph.indptr), np.asarray(_graph.indices)
+        lengths = 1.0 / np.asarray(_graph.weights, dtype=np.float64) if distance else np.ones(len(indices))
+        _lengths[distance] = sp.csr_matrix((lengths, indices, indptr), shape=(n, n))
+    return _lengths[distance]
+
+
+def _fixpoint(step, x):
+    # Iterate x = step(x) until it stops changing; on a DAG this takes as many
+    # rounds as its longest path
+    while True:
+        nxt = step(x)
+        if np.array_equal(nxt, x):
+            return x
+        x = nxt
+
+
+def pivot_sums(task):
+    # Per-vertex sums over a batch of pivots of the dependency and its square (zero
+    # without dependencies), and of the distance, its square and the count of
+    # pivots reaching the vertex
+    pivots, distance, dependencies = task
+    lengths = _length_matrix(distance)
+    b, n = len(pivots), lengths.shape[0]
+    dist = dijkstra(lengths, indices=pivots, unweighted=not distance)
+
+    reached = np.isfinite(dist) & (dist > 0)
+    d = np.where(reached, dist, 0)
+    sums = (d.sum(axis=0), (d ** 2).sum(axis=0), reached.sum(axis=0))
+    if not dependencies:
+        return (np.zeros(n), np.zeros(n)) + sums
+
+    # Edges on shortest paths from each pivot, stacked into one block-diagonal DAG
+    cols = lengths.indices
+    du, dv = dist[:, _rows], dist[:, cols]
+    on_path = np.isfinite(du) & (np.abs(du + lengths.data - dv) <= TOLERANCE * np.maximum(dv, 1))
+    batch, entry = np.nonzero(on_path)
+    src, dst = batch * n + _rows[entry], batch * n + cols[entry]
+    dag = sp.csr_matrix((np.ones(len(src)), (src, dst)), shape=(b * n, b * n))
+    dag_t = dag.T.tocsr()
+
+    start = np.zeros(b * n)
+    start[np.arange(b) * n + pivots] = 1
+    sigma = _fixpoint(lambda s: start + dag_t @ s, start)
+    inverse = np.divide(1.0, sigma, out=np.zeros_like(sigma), where=sigma > 0)
+    dependency = _fixpoint(lambda x: sigma * (dag @ ((1 + x) * inverse)), np.zeros(b * n))
+    dependency = dependency.reshape(b, n)
+    dependency[np.arange(b), pivots] = 0
+    return (dependency.sum(axis=0), (dependency ** 2).sum(axis=0)) + sums
+
+
+def _fpc(count, population):
+    # Finite-population correction: no error left once every pivot is drawn
+    return np.clip((population - count) / np.maximum(population - 1, 1), 0, 1)
+
+
+def _moments(total, squares, count):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = total / count
+        var = np.maximum(squares / count - mean ** 2, 0) * count / np.maximum(count - 1, 1)
+    return mean, var
+
+
+def _bernstein(total, squares, count, population, value_range):
+    # Half-width of a CONFIDENCE interval for a mean of values in [0, value_range]
+    mean, var = _moments(total, squares, count)
+    log = math.log(4 / (1 - CONFIDENCE))
+    half = np.sqrt(2 * var * log / count) + 7 * value_range * log / (3 * max(count - 1, 1))
+    return mean, half * np.sqrt(_fpc(count, population))
+
+
+def _normal(total, squares, count, population):
+    # Half-width of a normal-approximation CONFIDENCE interval for a mean
+    mean, var = _moments(total, squares, count)
+    z = NormalDist().inv_cdf((1 + CONFIDENCE) / 2)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return mean, z * np.sqrt(var / count * _fpc(count, population))
+
+
+def choose_pivots(n, samples=None, epsilon=None, delta=DELTA, seed=None):
+    # `samples` random vertices, or enough for epsilon, delta; all of them by default
+    if samples is None and epsilon is None:
+        return np.arange(n)
+    k = min(n, samples or sample_size(n, epsilon, delta))
+    return np.sort(np.random.default_rng(seed).choice(n, size=k, replace=False))
+
+
+def pivot_tasks(graph, pivots, distance, dependencies=True, workers=None):
+    # pivot_sums() tasks, batches bounded in memory and at least one per worker
+    workers = workers or os.cpu_count() or 1
+    n, k = len(graph.ids), len(pivots)
+    per_batch = max(1, min(BATCH_ENTRIES // max(len(graph.indices), n, 1), -(-k // workers)))
+    return [(pivots[i:i + per_batch], distance, dependencies) for i in range(0, k, per_batch)]
+
+
+def combine(ids, k, parts):
+    # The Centrality estimate from the pivot_sums() of k pivots. Betweenness counts
+    # every pair once, unnormalised, as igraph's betweenness(); closeness is
+    # 1 / mean distance to the reachable vertices, as igraph's closeness().
+    n = len(ids)
+    dep, dep2, dist, dist2, reached = (np.sum(part, axis=0) for part in zip(*parts))
+
+    # Pair dependencies: each unordered pair is seen from both ends, hence / 2
+    mean, half = _bernstein(dep, dep2, k, n, max(n - 2, 1))
+    betweenness, betweenness_error = n * mean / 2, n * half / 2
+
+    # Closeness from the pivots that reach each vertex (the vertex itself excluded)
+    population = np.maximum(reached * n / k, reached)
+    mean, half = _normal(dist, dist2, reached, population)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        closeness = np.where(reached > 0, 1 / mean, np.nan)
+        closeness_error = np.where(reached > 0, half / mean ** 2, np.nan)
+    return Centrality(np.asarray(ids), betweenness, betweenness_error, closeness, closeness_error, k)
+
+
+def estimate_centrality(path=EDGE_FILE, samples=None, epsilon=None, delta=DELTA, distance=False,
+                        workers=None, seed=None):
+    # Betweenness and closeness of every vertex from sampled pivots (see combine())
+    graph = load_csr(path)
+    pivots = choose_pivots(len(graph.ids), samples, epsilon, delta, seed)
+    tasks = pivot_tasks(graph, pivots, distance, workers=workers)
+    with ProcessPoolExecutor(min(workers or os.cpu_count() or 1, len(tasks)) or 1,
+                             initializer=init_worker, initargs=(path,)) as pool:
+        return combine(graph.ids, len(pivots), pool.map(pivot_sums, tasks))
+
+
+def normalized_betweenness(centrality):
+    # Scaled to [0, 1] like networkx's normalized=True: by the number of pairs
+    # not involving the vertex
+    n = len(centrality.ids)
+    scale = 2 / ((n - 1) * (n - 2)) if n > 2 else 1.0
+    return centrality.betweenness * scale, centrality.betweenness_error * scale
+
+
+def centrality_frame(centrality, normalized=False):
+    # Id, the estimates and the bounds of their confidence intervals
+    betweenness, error = normalized_betweenness(centrality) if normalized else \
+        (centrality.betweenness, centrality.betweenness_error)
+    return pd.DataFrame({
+        'Id': centrality.ids,
+        'Betweenness': betweenness,
+        'Betweenness_Low': np.maximum(betweenness - error, 0),
+        'Betweenness_High': betweenness + error,
+        'Closeness': centrality.closeness,
+        'Closeness_Low': centrality.closeness - centrality.closeness_error,
+        'Closeness_High': centrality.closeness + centrality.closeness_error,
+    })
+
+
+def add_sampling_args(parser):
+    # The sampling options shared by the scripts that compute centrality
+    parser.add_argument("--samples", type=int, help="approximate betweenness / closeness from this many pivots")
+    parser.add_argument("--epsilon", type=float,
+                        help="approximate, with enough pivots for this error in normalised betweenness")
+    parser.add_argument("--delta", type=float, default=DELTA, help="failure probability for --epsilon")
+    parser.add_argument("--workers", type=int, help="processes for the pivot searches (default: all cores)")
+    parser.add_argument("--seed", type=int, help="seed for the pivot sample")
+    return parser
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Sampled betweenness and closeness with confidence intervals")
+    parser.add_argument("--edges", default=EDGE_FILE)
+    parser.add_argument("--distance", action="store_true", help="use 1 / weight as edge length (default: hops)")
+    parser.add_argument("--output", default="coretweet_centrality_estimates.csv")
+    return add_sampling_args(parser).parse_args()
+
+
+def main():
+    args = parse_args()
+    centrality = estimate_centrality(args.edges, args.samples, args.epsilon, args.delta, args.distance,
+                                     args.workers, args.seed)
+    centrality_frame(centrality).to_csv(args.output, index=False)
+    print(f"Estimated from {centrality.samples} of {len(centrality.ids)} pivots; saved {args.output}")
+
+
+if __name__ == "__main__":
+    main()
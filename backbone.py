@@ -0,0 +1,82 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from graph_store import write_graph
+
+# backbone.py
+# Disparity-filter backbone of the co-retweet graph (Serrano, Boguna & Vespignani 2009).
+# An edge is kept when its weight is a significant share of the strength of either
+# endpoint under the null model of uniformly split weights. Runs between the edge
+# builder and community detection; later stages pick the backbone up through edge_file()
+# for as long as it is newer than the edge list.
+
+
+EDGE_FILE = "coretweet_edges.csv"
+BACKBONE_FILE = "coretweet_backbone_edges.csv"
+ALPHA = 0.05
+
+
+def edge_file(directory=""):
+    # The backbone if it has been extracted from the current edge list, otherwise
+    # the full edge list (a backbone older than it is stale and is skipped)
+    backbone, edges = os.path.join(directory, BACKBONE_FILE), os.path.join(directory, EDGE_FILE)
+    if not os.path.exists(backbone):
+        return edges
+    if os.path.exists(edges) and os.path.getmtime(backbone) < os.path.getmtime(edges):
+        print(f"Warning: {backbone} is older than {edges}; using the full edge list. "
+              f"Re-run backbone.py to refresh it.")
+        return edges
+    return backbone
+
+
+def disparity_pvalues(edges_df):
+    ids, codes = np.unique(edges_df[['source', 'target']].to_numpy().ravel(), return_inverse=True)
+    src, tgt = codes.reshape(-1, 2).T
+    w = edges_df['weight'].to_numpy(dtype=np.float64)
+
+    strength = np.bincount(src, w, len(ids)) + np.bincount(tgt, w, len(ids))
+    degree = np.bincount(src, minlength=len(ids)) + np.bincount(tgt, minlength=len(ids))
+
+    def pvalue(node):
+        # P(share >= w / s) = (1 - w / s) ** (k - 1); a degree-1 endpoint is never significant
+        k = degree[node]
+        p = (1.0 - w / strength[node]) ** np.maximum(k - 1, 0)
+        return np.where(k > 1, p, 1.0)
+
+    return np.minimum(pvalue(src), pvalue(tgt))
+
+
+def extract_backbone(edges_df, alpha=ALPHA):
+    pvalues = disparity_pvalues(edges_df)
+    return edges_df[pvalues < alpha].reset_index(drop=True)
+
+
+def report(edges_df, backbone_df, alpha):
+    def nodes(df):
+        return len(pd.unique(df[['source', 'target']].to_numpy().ravel()))
+
+    total_w, kept_w = edges_df['weight'].sum(), backbone_df['weight'].sum()
+    print(f"Disparity backbone at alpha = {alpha}:")
+    print(f"  Edges kept: {len(backbone_df)} / {len(edges_df)} ({len(backbone_df) / max(len(edges_df), 1):.1%})")
+    print(f"  Weight kept: {kept_w} / {total_w} ({kept_w / max(total_w, 1):.1%})")
+    print(f"  Nodes kept: {nodes(backbone_df)} / {nodes(edges_df)}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Keep only statistically significant co-retweet edges")
+    parser.add_argument("--alpha", type=float, default=ALPHA, help=f"significance level (default: {ALPHA})")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    edges_df = pd.read_csv(EDGE_FILE)
+    backbone_df = extract_backbone(edges_df, args.alpha)
+    backbone_df.to_csv(BACKBONE_FILE, index=False)
+    write_graph(backbone_df, BACKBONE_FILE)
+    report(edges_df, backbone_df, args.alpha)
+    print(f"Saved backbone to {BACKBONE_FILE}")
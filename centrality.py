@@ -0,0 +1,212 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.sparse.linalg import eigsh
+
+from approx_centrality import (DELTA, add_sampling_args, centrality_frame, choose_pivots, combine, init_worker,
+                               normalized_betweenness, pivot_sums, pivot_tasks)
+from backbone import EDGE_FILE, edge_file
+from graph_store import graph_path, load_csr
+from metrics_cache import cached
+from pagerank import load_start, pagerank, save_start
+
+# centrality.py
+# The centrality stage: every measure of the co-retweet graph computed once, at the
+# same time, and written to one coretweet_nodes_with_centrality.csv per edge file
+# that the analysis scripts read. PageRank, eigenvector centrality and the closeness and
+# betweenness pivot batches are all queued on one process pool; the workers map
+# the graph store's CSR arrays (read-only mmap, so one copy of the pages is
+# shared by every process and nothing is pickled but pivot lists and results).
+# Degree and strength are computed in the parent meanwhile.
+#
+# Measures follow the scripts they replace: Weighted_Degree_Strength, PageRank
+# and Betweenness as in networkx (weighted PageRank, betweenness normalised over
+# 1 / weight distances), Degree, Closeness and Eigenvector as in igraph (hops,
+# unweighted, eigenvector scaled to a maximum of 1). PageRank is pagerank.py's
+# power iteration, warm-started from the previous run's vector. Results are kept
+# in the metrics cache, so a rebuilt table for an unchanged graph only loads arrays.
+
+
+NODES_FILE = "coretweet_nodes_with_communities_and_details.csv"
+CENTRALITY_FILE = "coretweet_nodes_with_centrality.csv"
+INTERVALS_FILE = "coretweet_centrality_intervals.csv"
+MEASURES = ['Degree', 'Weighted_Degree_Strength', 'PageRank', 'Betweenness', 'Closeness', 'Eigenvector']
+
+
+def centrality_files(path=None):
+    # (table, intervals) written for an edge file: the names above for the full edge
+    # list, tagged with the edge file's name for any other, so stages reading
+    # different graphs never overwrite each other's table
+    stem = Path(path or edge_file()).stem
+    if stem == Path(EDGE_FILE).stem:
+        return CENTRALITY_FILE, INTERVALS_FILE
+    return tuple(f"{Path(name).stem}_{stem}.csv" for name in (CENTRALITY_FILE, INTERVALS_FILE))
+
+
+def _init_worker(path):
+    global _graph
+    _graph = load_csr(path)
+    init_worker(path)
+
+
+def _matrix(graph, weighted=True):
+    n = len(graph.ids)
+    data = np.asarray(graph.weights, dtype=np.float64) if weighted else np.ones(len(graph.indices))
+    return sp.csr_matrix((data, graph.indices, graph.indptr), shape=(n, n))
+
+
+def eigenvector(graph):
+    # Leading eigenvector of the unweighted adjacency, scaled to a maximum of 1
+    A = _matrix(graph, weighted=False)
+    if A.shape[0] < 3 or not A.nnz:
+        return np.ones(A.shape[0])
+    _, vectors = eigsh(A, k=1, which='LA')
+    v = np.abs(vectors[:, 0])
+    return v / v.max()
+
+
+def _pagerank(graph):
+    # Warm-started from the last saved vector, which the parent then replaces
+    return pagerank(graph, start=load_start(graph.ids)).values
+
+
+def _measure(name):
+    return {'PageRank': _pagerank, 'Eigenvector': eigenvector}[name](_graph)
+
+
+def compute_centrality(path=None, samples=None, epsilon=None, delta=DELTA, workers=None, seed=None):
+    # (centrality, intervals): one row of measures per vertex, and the confidence
+    # intervals of the sampled ones (None when every pivot was used)
+    path = path or edge_file()
+    graph = load_csr(path)
+    pivots = choose_pivots(len(graph.ids), samples, epsilon, delta, seed)
+    workers = workers or os.cpu_count() or 1
+
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(path,)) as pool:
+        # Betweenness is the heaviest, so its batches go first
+        between = [pool.submit(pivot_sums, t) for t in pivot_tasks(graph, pivots, True, workers=workers)]
+        spectral = {name: pool.submit(_measure, name) for name in ('PageRank', 'Eigenvector')}
+        close = [pool.submit(pivot_sums, t)
+                 for t in pivot_tasks(graph, pivots, False, dependencies=False, workers=workers)]
+
+        n = len(graph.ids)
+        rows = np.repeat(np.arange(n), np.diff(graph.indptr))
+        degree = np.diff(graph.indptr)
+        strength = np.bincount(rows, np.asarray(graph.weights, dtype=np.float64), minlength=n)
+        if np.array_equal(strength, np.round(strength)):
+            strength = strength.astype(np.int64)  # co-retweet counts
+
+        between = combine(graph.ids, len(pivots), [f.result() for f in between])
+        close = combine(graph.ids, len(pivots), [f.result() for f in close])
+        spectral = {name: f.result() for name, f in spectral.items()}
+    save_start(graph.ids, spectral['PageRank'])
+
+    betweenness, _ = normalized_betweenness(between)
+    centrality = pd.DataFrame({
+        'Id': np.asarray(graph.ids),
+        'Degree': degree,
+        'Weighted_Degree_Strength': strength,
+        'PageRank': spectral['PageRank'],
+        'Betweenness': betweenness,
+        'Closeness': close.closeness,
+        'Eigenvector': spectral['Eigenvector'],
+    })
+    if len(pivots) == n:
+        return centrality, None
+    intervals = centrality_frame(between, normalized=True)
+    intervals[['Closeness', 'Closeness_Low', 'Closeness_High']] = \
+        centrality_frame(close)[['Closeness', 'Closeness_Low', 'Closeness_High']]
+    return centrality, intervals
+
+
+def cached_centrality(path=None, samples=None, epsilon=None, delta=DELTA, workers=None, seed=None):
+    # compute_centrality() through the metrics cache, keyed by the edge file's
+    # content and the sample; unseeded samples differ every run, so are not cached
+    path = path or edge_file()
+    if (samples or epsilon) and seed is None:
+        return compute_centrality(path, samples, epsilon, delta, workers, seed)
+
+    def compute():
+        centrality, intervals = compute_centrality(path, samples, epsilon, delta, workers, seed)
+        return {'centrality': centrality} if intervals is None else \
+            {'centrality': centrality, 'intervals': intervals}
+
+    result = cached("centrality", compute, inputs=[path], samples=samples, epsilon=epsilon,
+                    delta=delta if epsilon else None, seed=seed if samples or epsilon else None)
+    return result['centrality'], result.get('intervals')
+
+
+def write_centrality(centrality, intervals=None, nodes_file=NODES_FILE, path=None):
+    # One row per graph vertex with the node table's columns and every measure,
+    # most influential (PageRank) first; vertices missing from the node table are
+    # kept (in community -1) and nodes missing from the graph are left out
+    nodes_df = pd.read_csv(nodes_file)
+    nodes_df['Id'] = nodes_df['Id'].astype(str)
+    centrality = centrality.assign(Id=centrality['Id'].astype(str))
+    output = nodes_df.drop(columns=MEASURES, errors='ignore').merge(centrality, on='Id', how='right')
+    missing = ~output['Id'].isin(nodes_df['Id'])
+    dropped = (~nodes_df['Id'].isin(centrality['Id'])).sum()
+    if missing.any() or dropped:
+        print(f"Warning: {missing.sum()} graph vertices are not in {nodes_file}; "
+              f"{dropped} of its nodes are not in the graph.")
+    if 'Community' in output.columns:
+        output['Community'] = output['Community'].fillna(-1).astype(np.int64)
+    output = output.sort_values(by='PageRank', ascending=False)
+    table_file, intervals_file = centrality_files(path)
+    output.to_csv(table_file, index=False, encoding='utf-8')
+
+    if intervals is not None:
+        intervals.to_csv(intervals_file, index=False)
+    elif os.path.exists(intervals_file):
+        os.remove(intervals_file)  # exact values now, so older intervals no longer apply
+    return output
+
+
+def load_centrality(path=None, nodes_file=NODES_FILE, rebuild=True, **sampling):
+    # The centrality table, (re)computed if it is missing a measure, older than the
+    # graph store or the node CSV, computed for other vertices (another edge file),
+    # if sampling options are given, or if it holds sampled estimates (it has
+    # intervals) and exact values are asked for
+    path = path or edge_file()
+    graph = load_csr(path)  # refresh the graph store first
+    table_file, intervals_file = centrality_files(path)
+    sources = [graph_path(path) / "ids.npy", nodes_file]
+    sampled = sampling.get('samples') or sampling.get('epsilon')
+    missing = not os.path.exists(table_file) or \
+        not set(MEASURES) <= set(pd.read_csv(table_file, nrows=0).columns)
+    stale = rebuild and (sampled or missing or os.path.exists(intervals_file) or any(
+        os.path.exists(s) and os.path.getmtime(s) > os.path.getmtime(table_file) for s in sources))
+    if not stale:
+        centrality = pd.read_csv(table_file, dtype={'Id': str})
+        stale = rebuild and set(centrality['Id']) != set(np.asarray(graph.ids).astype(str))
+    if stale:
+        print(f"Computing centrality of {path} ...")
+        return write_centrality(*cached_centrality(path, **sampling), nodes_file=nodes_file, path=path)
+    return centrality
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Centrality stage: every measure into one CSV")
+    parser.add_argument("--edges", help="edge CSV (default: the backbone if it is up to date, else all co-retweets)")
+    parser.add_argument("--nodes", default=NODES_FILE)
+    return add_sampling_args(parser).parse_args()
+
+
+def main():
+    args = parse_args()
+    centrality, intervals = cached_centrality(args.edges, args.samples, args.epsilon, args.delta, args.workers,
+                                              args.seed)
+    write_centrality(centrality, intervals, args.nodes, args.edges)
+    table_file, intervals_file = centrality_files(args.edges)
+    print(f"Saved {', '.join(MEASURES)} of {len(centrality)} nodes to {table_file}")
+    if intervals is not None:
+        print(f"Sampled estimates; confidence intervals in {intervals_file}")
+
+
+if __name__ == "__main__":
+    main()
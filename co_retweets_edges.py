@@ -1,40 +1,144 @@
+import argparse
+
+import numpy as np
 import pandas as pd
+import scipy.sparse as sp
+
+import retweet_stream
+from graph_store import write_graph
+import top_authors
+import tweet_cache
+
+
+CSV_FILE = "tweets.csv"
+EDGE_FILE = "coretweet_edges.csv"
+
+# Number of most-retweeted authors to keep; None projects every author
+TOP_AUTHORS = 1500
+
+
+def load_retweets(csv_file=CSV_FILE):
+    use_cols = ["author_id", "retweet_author_id", "reference_type"]
+    if tweet_cache.is_fresh(csv_file):
+        rows = tweet_cache.retweet_rows(csv_file)
+        return tweet_cache.load_columns(use_cols[:2], rows, csv_file).astype('int64')
+
+    # Read the IDs as nullable ints so 19-digit IDs don't lose precision as floats
+    df = pd.read_csv(csv_file, low_memory=False, usecols=use_cols,
+                     dtype={"author_id": "Int64", "retweet_author_id": "Int64"})
+    df = df[df['reference_type'] == 'retweeted']
+    return df[['author_id', 'retweet_author_id']].astype('int64')
+
+
+def top_author_ids(counts, top=TOP_AUTHORS):
+    return top_authors.rank(counts, top).index.to_numpy('int64')
+
+
+def select_top_authors(df, top=TOP_AUTHORS):
+    # Get users with the highest number of retweets
+    top_ids = top_author_ids(df['retweet_author_id'].value_counts(), top)
+    return df[df['retweet_author_id'].isin(top_ids)]
+
+
+# Binary retweeter x author matrix plus the sorted author IDs of its columns
+def incidence_matrix(retweeters, authors):
+    r_codes, _ = pd.factorize(retweeters)
+    author_ids, a_codes = np.unique(authors, return_inverse=True)
+    B = sp.csr_matrix(
+        (np.ones(len(r_codes), dtype=np.int32), (r_codes, a_codes)),
+        shape=(r_codes.max() + 1 if len(r_codes) else 0, len(author_ids)),
+    )
+    # A retweeter counts once per author, however often they retweeted them
+    B.data[:] = 1
+    return B, author_ids
+
+
+# Co-retweet weights are the strict upper triangle of B^T B
+def project(B):
+    return sp.triu(B.T @ B, k=1).tocoo()
+
+
+def edges_from_projection(W, author_ids):
+    # Author columns are sorted by ID, so row < col keeps source < target
+    edges_df = pd.DataFrame({
+        'source': author_ids[W.row],
+        'target': author_ids[W.col],
+        'weight': W.data.astype('int64'),
+    })
+    return edges_df.sort_values(['source', 'target'], ignore_index=True)
+
+
+def build_edges(df, top=TOP_AUTHORS):
+    df = select_top_authors(df, top)
+    B, author_ids = incidence_matrix(df['author_id'].to_numpy(), df['retweet_author_id'].to_numpy())
+    return edges_from_projection(project(B), author_ids)
+
 
-from collections import defaultdict
-from itertools import combinations
+def build_edges_parallel(df, top=TOP_AUTHORS, workers=4):
+    # Hash-partition retweeters over a process pool; each worker projects its own
+    # shard and the upper-triangular counts are summed, matching build_edges exactly
+    df = select_top_authors(df, top)
+    retweeters = df['author_id'].to_numpy()
+    author_ids, a_codes = np.unique(df['retweet_author_id'].to_numpy(), return_inverse=True)
+    shard = retweet_stream.partition_of(retweeters, workers)
+    tasks = ((retweeters[shard == s], a_codes[shard == s], len(author_ids)) for s in range(workers))
+    W = retweet_stream.merge_shards(retweet_stream.map_shards(tasks, workers), len(author_ids))
+    return edges_from_projection(W, author_ids)
 
 
-# === Step 1. Load data efficiently ===
-csv_file = "tweets.csv"
+def build_edges_streaming(csv_file=CSV_FILE, top=TOP_AUTHORS, memory_limit=retweet_stream.MEMORY_LIMIT, workers=1,
+                          approx_capacity=None):
+    # Same projection as build_edges, but tweets.csv is read in chunks and the
+    # retweet pairs spill to disk once they outgrow memory_limit. With
+    # approx_capacity the top authors come from a Space-Saving summary.
+    counter = None
+    if approx_capacity:
+        counter = top_authors.SpaceSaving(approx_capacity)
+    # Spilled pairs are split into at least one partition per worker
+    store = retweet_stream.ingest(csv_file, memory_limit=memory_limit, counter=counter,
+                                  n_partitions=max(retweet_stream.N_PARTITIONS, workers))
+    if store.spilled:
+        print(f"Retweet pairs exceeded {memory_limit / 1024 ** 2:.1f} MB; spilled to {store.spill_dir}")
+    try:
+        W, author_ids = store.coretweet_weights(top_author_ids(store.author_counts, top), workers)
+    finally:
+        store.cleanup()
+    return edges_from_projection(W, author_ids)
 
-use_cols = ["author_id", "retweet_author_id", "reference_type"]
-df = pd.read_csv(csv_file, low_memory=False, usecols=use_cols)
 
-# Get users with the highest number of retweets
-df = df[df['reference_type'] == 'retweeted'].copy()
-tweet_groups = df.groupby('retweet_author_id')['author_id'].apply(list)
-tweet_groups = tweet_groups.sort_values(key=lambda x: x.str.len(), ascending=False)
-top = tweet_groups.head(1500)
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build the co-retweet edge list from tweets.csv")
+    parser.add_argument("--top", type=int, default=TOP_AUTHORS,
+                        help=f"number of most retweeted authors to keep, 0 for all (default: {TOP_AUTHORS})")
+    parser.add_argument("--approx-top", action="store_true",
+                        help="pick the top authors with a Space-Saving summary (implies --stream)")
+    parser.add_argument("--stream", action="store_true",
+                        help="read tweets.csv in chunks with bounded memory")
+    parser.add_argument("--memory-limit", type=float, default=retweet_stream.MEMORY_LIMIT / 1024 ** 2,
+                        help="MB of retweet pairs kept in RAM before spilling to disk (with --stream)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes used to count co-retweets (default: 1, serial)")
+    return parser.parse_args()
 
-# Build an inverted index: retweeter -> set of authors they retweeted
-retweeter_to_authors = defaultdict(set)
-for author, retweeters in top.items():
-    for r in retweeters:
-        retweeter_to_authors[r].add(author)
 
-# Now count co-retweets between authors efficiently
-edge_weights = defaultdict(int)
+if __name__ == "__main__":
+    args = parse_args()
+    top = args.top or None
 
-for retweeter, authors in retweeter_to_authors.items():
-    authors = list(authors)
-    for a1, a2 in combinations(sorted(authors), 2):
-        edge_weights[(a1, a2)] += 1
+    if args.stream or args.approx_top:
+        capacity = 10 * top if args.approx_top and top else None
+        edges_df = build_edges_streaming(top=top, memory_limit=int(args.memory_limit * 1024 ** 2),
+                                         workers=args.workers, approx_capacity=capacity)
+    else:
+        # === Step 1. Load data efficiently ===
+        retweets = load_retweets()
 
-# Convert to DataFrame
-edges_df = pd.DataFrame([
-    {'source': a1, 'target': a2, 'weight': w}
-    for (a1, a2), w in edge_weights.items()
-])
-edges_df.to_csv("coretweet_edges.csv", index=False)
+        # === Step 2. Project the top authors onto a co-retweet graph ===
+        if args.workers > 1:
+            edges_df = build_edges_parallel(retweets, top, workers=args.workers)
+        else:
+            edges_df = build_edges(retweets, top)
+    edges_df.to_csv(EDGE_FILE, index=False)
+    write_graph(edges_df, EDGE_FILE)
 
-print("done")
\ No newline at end of file
+    print("done")
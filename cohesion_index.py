@@ -0,0 +1,207 @@
+import argparse
+import os
+import shutil
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from graph_store import graph_path, load_csr
+
+# cohesion_index.py
+# Core and truss numbers of the co-retweet graph, stored beside the node CSVs as
+# <nodes>.cohesion/ so dense-subgraph queries are array lookups. Core numbers come
+# from level-by-level peeling (Batagelj & Zaversnik 2003); truss numbers from edge
+# peeling with incremental triangle-support updates (Wang & Cheng 2012). Both are
+# stored for the whole graph and for the graph of intra-community edges only, which
+# is what per-community queries (and the clique search) need. Truss arrays are
+# aligned with the CSR entries of the edge file's graph store, so the truss of
+# every edge at a vertex is one slice, like its neighbours; inter-community
+# entries have community truss 0.
+
+
+EDGE_FILE = "coretweet_edges.csv"
+NODES_FILE = "coretweet_nodes_with_communities.csv"
+COHESION_FILE = "coretweet_nodes_with_cohesion.csv"
+
+CohesionIndex = namedtuple("CohesionIndex", ["ids", "community", "core", "truss", "community_core",
+                                             "community_truss"])
+
+
+def index_path(nodes_file=NODES_FILE):
+    return Path(nodes_file).with_suffix(".cohesion")
+
+
+def core_numbers(graph):
+    # Peel every vertex of degree <= k at once, until none is left at this level
+    n = len(graph.ids)
+    indptr, indices = np.asarray(graph.indptr), np.asarray(graph.indices)
+    degree = np.diff(indptr)
+    core = np.zeros(n, dtype=np.int32)
+    alive = np.ones(n, dtype=bool)
+    k = 0
+    while alive.any():
+        k = max(k, int(degree[alive].min()))
+        peel = np.flatnonzero(alive & (degree <= k))
+        while len(peel):
+            core[peel] = k
+            alive[peel] = False
+            entries = np.concatenate([np.arange(indptr[i], indptr[i + 1]) for i in peel])
+            degree -= np.bincount(indices[entries], minlength=n)
+            peel = np.flatnonzero(alive & (degree <= k))
+    return core
+
+
+def truss_numbers(graph):
+    # Truss number of every CSR entry: the largest k such that the edge lies in a
+    # subgraph where each edge is in at least k - 2 triangles
+    n = len(graph.ids)
+    indptr, indices = np.asarray(graph.indptr), np.asarray(graph.indices)
+    rows = np.repeat(np.arange(n), np.diff(indptr))
+    upper = rows < indices
+    u, v = rows[upper], indices[upper]
+    m = len(u)
+
+    # Edge ID of each entry, shared by (u, v) and (v, u)
+    E = sp.csr_matrix((np.arange(1, m + 1), (u, v)), shape=(n, n))
+    E = (E + E.T).tocsr()
+    E.sort_indices()
+    eid = E.data - 1
+
+    B = sp.csr_matrix((np.ones(2 * m, dtype=np.int32), (np.r_[u, v], np.r_[v, u])), shape=(n, n))
+    support = np.asarray((B @ B)[u, v]).ravel().astype(np.int64)
+
+    alive = np.ones(len(indices), dtype=bool)
+    removed = np.zeros(m, dtype=bool)
+    truss = np.zeros(m, dtype=np.int32)
+    k, remaining = 2, m
+    while remaining:
+        stack = np.flatnonzero(~removed & (support <= k - 2)).tolist()
+        while stack:
+            e = stack.pop()
+            if removed[e]:
+                continue
+            removed[e] = True
+            truss[e] = k
+            remaining -= 1
+            # Every triangle through e loses an edge
+            a, b = u[e], v[e]
+            pa = np.arange(indptr[a], indptr[a + 1])
+            pa = pa[alive[pa]]
+            pb = np.arange(indptr[b], indptr[b + 1])
+            pb = pb[alive[pb]]
+            _, ia, ib = np.intersect1d(indices[pa], indices[pb], assume_unique=True, return_indices=True)
+            hit = np.concatenate([eid[pa[ia]], eid[pb[ib]]])
+            support[hit] -= 1
+            stack.extend(hit[support[hit] == k - 2].tolist())
+            alive[pa[indices[pa] == b]] = False
+            alive[pb[indices[pb] == a]] = False
+        k += 1
+    return truss[eid]
+
+
+def intra_community(graph, community):
+    # The graph restricted to edges between members of the same community
+    rows = np.repeat(np.arange(len(graph.ids)), np.diff(graph.indptr))
+    inside = (community[rows] == community[graph.indices]) & (community[rows] >= 0)
+    indptr = np.zeros(len(graph.indptr), dtype=np.int64)
+    np.cumsum(np.bincount(rows[inside], minlength=len(graph.ids)), out=indptr[1:])
+    return graph._replace(indptr=indptr, indices=graph.indices[inside], weights=graph.weights[inside]), inside
+
+
+def build_index(edge_file=EDGE_FILE, nodes_file=NODES_FILE):
+    graph = load_csr(edge_file)
+    community = pd.read_csv(nodes_file).drop_duplicates('Id').set_index('Id')['Community'].reindex(graph.ids)
+    community = community.fillna(-1).to_numpy(np.int64)
+    intra, inside = intra_community(graph, community)
+    community_truss = np.zeros(len(graph.indices), dtype=np.int32)
+    community_truss[inside] = truss_numbers(intra)
+    return CohesionIndex(np.asarray(graph.ids), community, core_numbers(graph), truss_numbers(graph),
+                         core_numbers(intra), community_truss)
+
+
+def save_index(index, nodes_file=NODES_FILE):
+    root = index_path(nodes_file)
+    tmp = root.with_name(root.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    for name, array in index._asdict().items():
+        np.save(tmp / f"{name}.npy", array)
+    shutil.rmtree(root, ignore_errors=True)
+    tmp.rename(root)
+    return root
+
+
+def load_index(edge_file=EDGE_FILE, nodes_file=NODES_FILE, rebuild=True):
+    # Memory-map the index, (re)building it if it is missing or older than the
+    # graph store or the node CSV it was computed from
+    root = index_path(nodes_file)
+    load_csr(edge_file)  # refresh the graph store first
+    sources = [graph_path(edge_file) / "ids.npy", nodes_file]
+    missing = not all((root / f"{name}.npy").exists() for name in CohesionIndex._fields)
+    stale = rebuild and (missing or any(
+        os.path.exists(s) and os.path.getmtime(s) > os.path.getmtime(root / "ids.npy") for s in sources))
+    if stale:
+        save_index(build_index(edge_file, nodes_file), nodes_file)
+    return CohesionIndex(*(np.load(root / f"{name}.npy", mmap_mode="r") for name in CohesionIndex._fields))
+
+
+# --- Queries ---
+
+def node_truss(graph, truss):
+    # Largest truss number among a vertex's edges (0 for isolated vertices)
+    result = np.zeros(len(graph.ids), dtype=np.int32)
+    rows = np.repeat(np.arange(len(graph.ids)), np.diff(graph.indptr))
+    np.maximum.at(result, rows, truss)
+    return result
+
+
+def nodes_with_core(index, k):
+    # IDs of the k-core
+    return index.ids[index.core >= k]
+
+
+def densest_group(graph, index, community):
+    # (k, IDs) of the highest truss within the community's own edges
+    members = index.community == community
+    rows = np.repeat(np.arange(len(graph.ids)), np.diff(graph.indptr))
+    inside = members[rows] & (index.community_truss > 0)
+    if not inside.any():
+        return 0, index.ids[:0]
+    k = int(index.community_truss[inside].max())
+    return k, index.ids[np.unique(rows[inside & (index.community_truss == k)])]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Core / truss index of the co-retweet graph")
+    parser.add_argument("--rebuild", action="store_true", help="recompute even if the index is up to date")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.rebuild:
+        save_index(build_index())
+    graph = load_csr(EDGE_FILE)
+    index = load_index()
+    print(f"Max core number: {index.core.max()}, max truss number: {index.truss.max()}")
+
+    for community in np.unique(index.community[index.community >= 0]):
+        k, ids = densest_group(graph, index, community)
+        print(f"Community {community}: densest group is a {k}-truss of {len(ids)} nodes")
+
+    pd.DataFrame({
+        'Id': index.ids,
+        'Community': index.community,
+        'Core': index.core,
+        'Truss': node_truss(graph, index.truss),
+        'Community_Core': index.community_core,
+        'Community_Truss': node_truss(graph, index.community_truss),
+    }).to_csv(COHESION_FILE, index=False)
+    print(f"Saved core and truss numbers to {COHESION_FILE}")
+
+
+if __name__ == "__main__":
+    main()
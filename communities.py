@@ -4,14 +4,23 @@ import pandas as pd
 import networkx as nx
 import numpy as np
 import matplotlib.pyplot as plt
-import matplotlib.cm as cm
 import matplotlib.colors as mcolors
+
+from backbone import edge_file
+from force_layout import forceatlas2_layout
+from graph_store import edge_arrays, load_csr
+from layout_cache import cached_layout
+from raster import edge_counts, render, save_image, to_pixels
 # Communities.py
 # Read nodes CSV, count communities, and visualize network with differently coloured communities using networkx
 
 
 DATA_DIR = Path(__file__).parent
 NODES_FILE = DATA_DIR / "coretweet_nodes_with_communities_and_details.csv"
+DPI = 200
+SCALE_FACTOR = 0.2  # node size of the outlined version
+LINEWIDTH = 0.6
+EDGE_COLOR = "black"
 
 def choose_column(cols, candidates):
     lc = {c.lower(): c for c in cols}
@@ -20,6 +29,13 @@ def choose_column(cols, candidates):
             return lc[cand.lower()]
     return None
 
+def try_load_graph():
+    # the co-retweet edge lists have a binary CSR copy that loads without parsing
+    p = Path(edge_file(DATA_DIR))
+    if p.exists():
+        return load_csr(p)
+    return None
+
 def try_read_edges():
     # common edge filenames to try
     candidates = [
@@ -79,8 +95,14 @@ def main():
                 G.nodes[node][c] = row[c]
 
     # Try to load an edges file (common names). If found, add edges.
-    edges_df = try_read_edges()
-    if edges_df is not None:
+    graph = try_load_graph()
+    edges_df = try_read_edges() if graph is None else None
+    if graph is not None:
+        u, v, _ = edge_arrays(graph)
+        names = graph.ids.astype(str)
+        G.add_edges_from(zip(names[u].tolist(), names[v].tolist()))
+        print(f"Loaded edges from file. Graph has {G.number_of_nodes()} nodes and {G.number_of_edges()} edges.")
+    elif edges_df is not None:
         # detect source/target columns
         src_col = choose_column(edges_df.columns, ["source", "src", "from", "u", "node1", "source_id"])
         tgt_col = choose_column(edges_df.columns, ["target", "tgt", "to", "v", "node2", "target_id"])
@@ -109,19 +131,22 @@ def main():
     color_idx = cat.codes  # integers 0..k-1
 
     # choose colormap with enough distinct colors
-    cmap = cm.get_cmap("tab20", max(3, n_communities))
+    cmap = plt.get_cmap("tab20", max(3, n_communities))
     node_colors = [cmap(i % cmap.N) for i in color_idx]
 
     # layout
     if G.number_of_edges() > 0:
-        pos = nx.forceatlas2_layout(G, max_iter=800, scaling_ratio=1, seed=42)
+        pos = cached_layout(G, forceatlas2_layout, "communities", max_iter=800, scaling_ratio=1, seed=42)
     else:
         pos = nx.circular_layout(G)
 
-    plt.figure(figsize=(14, 10))
-    # draw edges lightly
-    if G.number_of_edges() > 0:
-        nx.draw_networkx_edges(G, pos, alpha=0.3, width=0.6)
+    # Rasterise straight into a 14x10 inch, 200 dpi pixel buffer
+    nodes = list(G.nodes())
+    index = {node: i for i, node in enumerate(nodes)}
+    xy = np.array([pos[node] for node in nodes], dtype=np.float64)
+    u, v = (np.array(c, dtype=np.int64) for c in zip(*((index[a], index[b]) for a, b in G.edges()))) \
+        if G.number_of_edges() else (np.zeros(0, dtype=np.int64),) * 2
+    width, height = 14 * DPI, 10 * DPI
 
     # draw nodes (size scaled by degree if edges exist)
     if G.number_of_edges() > 0:
@@ -129,68 +154,41 @@ def main():
         dmin, dmax = degrees.min(), degrees.max()
         max_size = 300
         min_size = 20
-        node_sizes = min_size + (degrees - dmin) * (max_size - min_size) / (dmax - dmin)
-
-        nx.draw_networkx_nodes(G, pos, node_size=node_sizes, node_color=node_colors, edgecolors="black", linewidths=0.3)
-        nx.draw_networkx_edges(G, pos, alpha=0.01, width=0.01, edge_color='red')
+        node_sizes = min_size + (degrees - dmin) * (max_size - min_size) / max(dmax - dmin, 1)
+        outline = 0.3
     else:
-        nx.draw_networkx_nodes(G, pos, node_size=80, node_color=node_colors)
+        node_sizes = np.full(len(nodes), 80.0)
+        outline = 0.0
 
     # optional labels when graph is small
+    labels = None
     if G.number_of_nodes() <= 50:
-        nx.draw_networkx_labels(G, pos, font_size=8)
-
-    plt.title(f"The {n_communities} Communities of Co-Retweet Network")
-    plt.axis("off")
+        px, py = to_pixels(xy, width, height)
+        labels = list(zip(px, py, nodes))
 
     # legend: map community labels to colors (show up to 25)
+    patches = None
     if n_communities <= 25:
         import matplotlib.patches as mpatches
         patches = []
         for i, comm in enumerate(unique_comms):
             patches.append(mpatches.Patch(color=cmap(i % cmap.N), label=str(comm)))
-        plt.legend(handles=patches, bbox_to_anchor=(1.05, 1), loc="upper left", title="Community")
 
+    title = f"The {n_communities} Communities of Co-Retweet Network"
+    counts = edge_counts(*to_pixels(xy, width, height), u, v, width, height)
+    image = render(xy, u, v, width, height, node_colors, node_sizes, dpi=DPI, edge_alpha=0.3, edge_width=0.6,
+                   outline_color="black", outline_width=outline, counts=counts)
     out_png = DATA_DIR / "communities_visualization.png"
-    plt.tight_layout()
-    plt.savefig(out_png, dpi=200)
+    save_image(image, out_png, dpi=DPI, title=title, legend=patches, legend_title="Community", labels=labels)
     print(f"Saved visualization to: {out_png}")
-    plt.show()
+
+    # scale down plotted nodes and add a thin black outline for improved readability;
+    # only the nodes change, so the edge counts are reused
+    image = render(xy, u, v, width, height, node_colors, node_sizes * SCALE_FACTOR, dpi=DPI, edge_alpha=0.3,
+                   edge_width=0.6, outline_color=EDGE_COLOR, outline_width=LINEWIDTH, counts=counts)
+    out_png = DATA_DIR / "communities_visualization_outlined.png"
+    save_image(image, out_png, dpi=DPI, title=title, legend=patches, legend_title="Community", labels=labels)
+    print(f"Saved outlined visualization to: {out_png}")
 
 if __name__ == "__main__":
     main()
-
-    # scale down plotted nodes and add a thin black outline for improved readability,
-    # then re-save the figure (works on the last-created matplotlib figure)
-    import matplotlib.collections as mcoll
-    import matplotlib.pyplot as plt
-
-    fig = plt.gcf()
-    SCALE_FACTOR = 0.2  # reduce node marker size to 35% of original
-    LINEWIDTH = 0.6
-    EDGE_COLOR = "black"
-
-    modified = False
-    for ax in fig.axes:
-        for coll in list(ax.collections):
-            if isinstance(coll, mcoll.PathCollection):
-                sizes = coll.get_sizes()
-                if sizes is None or len(sizes) == 0:
-                    continue
-                try:
-                    coll.set_sizes(sizes * SCALE_FACTOR)
-                    coll.set_edgecolors(EDGE_COLOR)
-                    coll.set_linewidths(LINEWIDTH)
-                    modified = True
-                except Exception:
-                    # skip collections that don't support these changes
-                    continue
-
-    if modified:
-        out_png = Path(__file__).parent / "communities_visualization_outlined.png"
-        plt.tight_layout()
-        plt.savefig(out_png, dpi=200)
-        print(f"Saved outlined visualization to: {out_png}")
-        plt.show()
-    else:
-        print("No node collections found to adjust.")
\ No newline at end of file
@@ -1,8 +1,10 @@
-import igraph as ig
 import pandas as pd
 import pycountry
 from pycountry_convert import country_alpha2_to_continent_code, country_name_to_country_alpha2
 
+from graph_store import load_csr, to_igraph
+from metrics_cache import cached
+
 NODE_FILE = "coretweet_nodes_with_communities_and_more_details.csv"
 EDGE_FILE = "coretweet_edges.csv"
 
@@ -157,14 +159,12 @@ def map_location_to_continent(location_str):
 def analyze_homophily():
     # --- 1. Load Data ---
     nodes_df = pd.read_csv(NODE_FILE)
-    edges_df = pd.read_csv(EDGE_FILE)
+    graph = load_csr(EDGE_FILE)
 
     # --- 2. Clean and Prepare Data (MOVED UP) ---
     
 
     nodes_df['Id'] = nodes_df['Id'].astype(str)
-    edges_df['source'] = edges_df['source'].astype(str)
-    edges_df['target'] = edges_df['target'].astype(str)
         
     original_rows = len(nodes_df)
     nodes_df = nodes_df.drop_duplicates(subset=['Id'], keep='first')
@@ -172,12 +172,15 @@ def analyze_homophily():
     if dropped_rows > 0:
         print(f"Warning: Removed {dropped_rows} duplicate node entries from {NODE_FILE}.")
 
-    print(f"Loaded {len(nodes_df)} unique nodes and {len(edges_df)} edges.")
+    print(f"Loaded {len(nodes_df)} unique nodes and {len(graph.indices) // 2} edges.")
 
     # --- Map locations to continents ---
     print("Mapping locations to continents... (This may take a moment)")
     nodes_df['clean_location'] = nodes_df["Location"].apply(clean_location)
-    nodes_df['Continent'] = nodes_df['clean_location'].apply(map_location_to_continent)
+    # Cached by the node file's content and the lookup tables, so only new data is mapped again
+    continents = cached("continents", lambda: {"Continent": nodes_df['clean_location'].apply(map_location_to_continent)},
+                        inputs=[NODE_FILE], maps=(MANUAL_MAP, CONTINENT_MAP))
+    nodes_df['Continent'] = continents["Continent"]
     
     # Convert string continents to unique integer IDs for assortativity
     unique_continents = sorted(list(nodes_df['Continent'].unique()))
@@ -201,14 +204,10 @@ def analyze_homophily():
 
     # --- 3. Build the Graph ---
     try:
-        g = ig.Graph.DataFrame(
-            edges_df,
-            directed=False,
-            use_vids=False
-        )
+        g = to_igraph(graph, str_names=True)
     except Exception as e:
         print(f"Error creating graph from edge list: {e}")
-        edge_ids = set(edges_df['source']).union(set(edges_df['target']))
+        edge_ids = set(graph.ids.astype(str))
         node_ids = set(nodes_df.index)
         missing_ids = edge_ids - node_ids
         if missing_ids:
@@ -294,31 +293,42 @@ def analyze_homophily():
         print(f"Analysis will run on subgraph of {g_known.vcount()} nodes and {g_known.ecount()} edges.")
 
     # --- 6. Method 1: Calculate Assortativity ---
-    print("\n--- Analysis Results ---")
-    assortativity_val = g_known.assortativity_nominal(
-        types=g_known.vs['continent_id'], 
-        directed=False
-    )
-    print(f"Continent Assortativity Coefficient (r): {assortativity_val:.4f}")
+    def homophily():
+        assortativity_val = g_known.assortativity_nominal(
+            types=g_known.vs['continent_id'], 
+            directed=False
+        )
 
-    # --- 7. Method 2: Calculate E-I Index ---
-    internal_edges = 0
-    external_edges = 0
-    
-    for edge in g_known.es:
-        source_node = g_known.vs[edge.source]
-        target_node = g_known.vs[edge.target]
-        
-        try:
-            weight = edge["weight"]
-        except KeyError:
-            weight = 1
+        # --- 7. Method 2: Calculate E-I Index ---
+        internal_edges = 0
+        external_edges = 0
         
-        # --- UPDATED: Use continent_id ---
-        if source_node['continent_id'] == target_node['continent_id']:
-            internal_edges += weight
-        else:
-            external_edges += weight
+        for edge in g_known.es:
+            source_node = g_known.vs[edge.source]
+            target_node = g_known.vs[edge.target]
+            
+            try:
+                weight = edge["weight"]
+            except KeyError:
+                weight = 1
+            
+            # --- UPDATED: Use continent_id ---
+            if source_node['continent_id'] == target_node['continent_id']:
+                internal_edges += weight
+            else:
+                external_edges += weight
+
+        community_assortativity = g.assortativity_nominal(types=g.vs["Community"], directed=False) \
+            if "Community" in g.vs.attributes() else float("nan")
+        return {"assortativity": assortativity_val, "internal": internal_edges, "external": external_edges,
+                "community_assortativity": community_assortativity}
+
+    results = cached("homophily", homophily, inputs=[EDGE_FILE, NODE_FILE], maps=(MANUAL_MAP, CONTINENT_MAP))
+    assortativity_val = results["assortativity"]
+    internal_edges, external_edges = results["internal"], results["external"]
+
+    print("\n--- Analysis Results ---")
+    print(f"Continent Assortativity Coefficient (r): {assortativity_val:.4f}")
             
     total_edges = internal_edges + external_edges
     
@@ -330,10 +340,7 @@ def analyze_homophily():
 
     # --- 8. Sanity Check: Community Homophily ---
     if "Community" in g.vs.attributes():
-        community_assortativity = g.assortativity_nominal(
-            types=g.vs["Community"], 
-            directed=False
-        )
+        community_assortativity = results["community_assortativity"]
         print(f"\n--- Sanity Check ---")
         print(f"Community Assortativity: {community_assortativity:.4f}")
 
@@ -1,61 +1,71 @@
-import igraph as ig
-from collections import defaultdict
+import argparse
+import os
+
 import pandas as pd
 
+from backbone import edge_file
+from community_detection import SEEDS, detect_communities, update_communities
+from graph_store import graph_path, load_csr, save_graph, to_igraph
+from user_details import write_details
+
+
+NODES_FILE = "coretweet_nodes_with_communities.csv"
 
-# Load the co-retweet edges
-edges_df = pd.read_csv("coretweet_edges.csv")
-print(edges_df.info())
-print(edges_df.head())
-# Create the graph
-g = ig.Graph.DataFrame(
-    edges_df,
-    directed=False,
-    vertices=None,           # infer vertices automatically
-    use_vids=False,          # treat source/target as labels
-)
-# Calculate communities using the Louvain algorithm
-partition = g.community_multilevel(weights=g.es["weight"])
 
-# Assign community membership to vertices
-g.vs['community'] = partition.membership
+def parse_args():
+    parser = argparse.ArgumentParser(description="Detect communities and attach user details")
+    parser.add_argument("--method", choices=["louvain", "leiden"], default="louvain")
+    parser.add_argument("--resolution", type=float, default=1.0)
+    parser.add_argument("--seeds", type=int, default=SEEDS, help=f"runs combined into the consensus (default: {SEEDS})")
+    parser.add_argument("--incremental", action="store_true",
+                        help=f"warm-start from the previous {NODES_FILE} and only re-optimise changed nodes "
+                             "with Louvain moves (re-run without it now and then for a fresh optimum)")
+    args = parser.parse_args()
+    if args.incremental and args.method != "louvain":
+        parser.error("--incremental re-optimises with Louvain moves only; run without it for --method leiden")
+    return args
 
-#print the number of communities found
-print(f"Number of communities found: {len(partition)}")
 
+def main():
+    args = parse_args()
 
-# Save nodes, with community to CSV
-nodes_df = pd.DataFrame({
-    'Id': g.vs['name'],
-    'Community': g.vs['community'],
-})
-nodes_df.to_csv("coretweet_nodes_with_communities.csv", index=False)
+    # Load the co-retweet graph (the disparity backbone if it is up to date)
+    print(f"Loading edges from {edge_file()}")
+    g = to_igraph(load_csr(edge_file()))
+    print(f"Graph has {g.vcount()} nodes and {g.ecount()} edges")
 
-# Load the full tweets data to get user details
-tweets_df = pd.read_csv("tweets.csv")
-tweets_df = tweets_df[tweets_df['reference_type'] == 'retweeted'].copy()
+    # The graph the previous communities were computed on is kept beside the node CSV
+    previous_graph = graph_path(NODES_FILE)
+    if args.incremental and os.path.exists(NODES_FILE) and previous_graph.exists():
+        membership = update_communities(edge_file(), pd.read_csv(NODES_FILE),
+                                        load_csr(NODES_FILE, rebuild=False),
+                                        args.resolution)
+    else:
+        # Calculate communities: a consensus of many seeded Louvain/Leiden runs, so the
+        # partition and its IDs don't change between runs
+        partitions, report = detect_communities(edge_file(), args.method, [args.resolution], args.seeds)
+        print(report.to_string(index=False))
+        membership = partitions[args.resolution]
 
-# Convert IDs to strings for consistency
-tweets_df['retweet_author_id'] = tweets_df['retweet_author_id'].astype(str)
-nodes_df['Id'] = nodes_df['Id'].astype(str)
+    # Assign community membership to vertices
+    g.vs['community'] = membership.tolist()
 
-# Keep the row with highest retweet_count per user
-user_details_df = tweets_df.sort_values('retweet_count', ascending=False)\
-                            .drop_duplicates('retweet_author_id')
+    #print the number of communities found
+    print(f"Number of communities found: {len(set(g.vs['community']))}")
+    print(f"Modularity: {g.modularity(g.vs['community'], weights='weight', resolution=args.resolution):.4f}")
 
-# Select only needed columns and rename for clarity
-user_details_df = user_details_df[['retweet_author_id', 'retweeted_screen_name', 'text', 'created_at']]
-user_details_df = user_details_df.rename(columns={
-    'retweet_author_id': 'Id',
-    'retweet_screen_name': 'Name',
-    'text': 'Text',
-    'created_at': 'Time'
-})
 
-# Merge node info with user details
-output_df = nodes_df.merge(user_details_df, on='Id', how='left')
+    # Save nodes, with community to CSV
+    nodes_df = pd.DataFrame({
+        'Id': g.vs['name'],
+        'Community': g.vs['community'],
+    })
+    nodes_df.to_csv(NODES_FILE, index=False)
+    save_graph(load_csr(edge_file()), NODES_FILE)
 
-# Save final CSV
-output_df.to_csv("coretweet_nodes_with_communities_and_details.csv", index=False)
+    # One pass over the tweets for the details (and location) of just these nodes
+    write_details(nodes_df)
 
 
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,45 @@
+import argparse
+import os
 import pandas as pd
 import networkx as nx
-import matplotlib.pyplot as plt
 import matplotlib.colors as mcolors
 import sys
 import numpy as np
 
+from approx_centrality import add_sampling_args
+from backbone import edge_file
+from centrality import centrality_files, load_centrality
+from force_layout import spring_layout
+from graph_store import load_csr, to_networkx
+from layout_cache import cached_layout
+from raster import render, save_image
+
 # --- Configuration ---
 NODE_FILE = "coretweet_nodes_with_communities_and_details.csv"
-EDGE_FILE = "coretweet_edges.csv"
+EDGE_FILE = edge_file()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Centrality of the co-retweet network and its visualisation")
+    return add_sampling_args(parser).parse_args()
 
-def full_analysis_and_visualization():
+def full_analysis_and_visualization(args):
 
-    # --- 1. Load Node Data ---
-    print(f"Loading node details from {NODE_FILE}...")
-    nodes_df = pd.read_csv(NODE_FILE)
+    # --- 1. Load Node Data and Centrality ---
+    # The centrality stage computes every measure once (in parallel) and caches it in
+    # coretweet_nodes_with_centrality.csv (one table per edge file); it only reruns
+    # when the inputs changed or sampling options were given
+    print(f"Loading node details and centrality of {NODE_FILE}...")
+    nodes_df = load_centrality(EDGE_FILE, NODE_FILE, samples=args.samples, epsilon=args.epsilon,
+                               delta=args.delta, workers=args.workers, seed=args.seed)
+    final_output_df = nodes_df.copy()
 
     # --- 2. Load Edge Data ---
     print(f"Loading edge list from {EDGE_FILE}...")
-    edges_df = pd.read_csv(EDGE_FILE)
+    graph = load_csr(EDGE_FILE)
 
     # --- 3. Build Graph with NetworkX ---
     print("Building graph...")
-    G = nx.Graph()
-
-    edges_df['source'] = edges_df['source'].astype(str)
-    edges_df['target'] = edges_df['target'].astype(str)
-    G.add_weighted_edges_from(edges_df[['source', 'target', 'weight']].values)
+    G = to_networkx(graph)
 
     nodes_df['Id'] = nodes_df['Id'].astype(str)
     nodes_df = nodes_df.set_index('Id')
@@ -40,56 +54,11 @@ def full_analysis_and_visualization():
 
     print(f"Graph created with {G.number_of_nodes()} nodes and {G.number_of_edges()} edges.")
     
-    # --- 4. Calculate Centrality Measures ---
-    print("Calculating centrality measures")
-
-    # a) Weighted Degree (Strength)
-    print("Calculating Weighted Degree (Strength)...")
-    strength = dict(G.degree(weight='weight'))
-    nx.set_node_attributes(G, strength, 'Weighted_Degree_Strength')
-
-    # b) PageRank
-    print("Calculating PageRank...")
-    pagerank = nx.pagerank(G, weight='weight')
-    nx.set_node_attributes(G, pagerank, 'PageRank')
-
-    # c) Betweenness Centrality
-    print("Calculating Betweenness Centrality")
-    edges_df['distance'] = 1.0 / edges_df['weight']
-    G_with_distance = nx.Graph()
-    G_with_distance.add_weighted_edges_from(edges_df[['source', 'target', 'distance']].values, weight='distance')
-    betweenness = nx.betweenness_centrality(G_with_distance, weight='distance', normalized=True)
-    nx.set_node_attributes(G, betweenness, 'Betweenness')
-
-    print("Centrality calculations complete.")
-
-    # --- 5. Finalize and Save Output to CSV ---
-    print("Saving centrality results to coretweet_nodes_with_centrality.csv")
-    
-    centrality_df = pd.DataFrame({
-        'Id': list(strength.keys()),
-        'Weighted_Degree_Strength': list(strength.values()),
-        'PageRank': [pagerank.get(n, 0) for n in strength.keys()],
-        'Betweenness': [betweenness.get(n, 0) for n in strength.keys()]
-    }).set_index('Id')
-
-    final_output_df = nodes_df.merge(
-        centrality_df,
-        left_index=True,
-        right_index=True,
-        how='left'
-    ).reset_index().rename(columns={'index': 'Id'})
-
-    final_output_df = final_output_df.sort_values(by='PageRank', ascending=False)
-    
-    centrality_cols = ['Weighted_Degree_Strength', 'PageRank', 'Betweenness']
-    final_output_df[centrality_cols] = final_output_df[centrality_cols].fillna(0)
+    _, intervals_file = centrality_files(EDGE_FILE)
+    if os.path.exists(intervals_file):
+        print(f"Betweenness is a sampled estimate; confidence intervals in {intervals_file}")
 
-    final_output_df.to_csv("coretweet_nodes_with_centrality.csv", index=False, encoding='utf-8')
-    
-    print("Successfully saved CSV file.")
-
-    # --- 6. Prepare for Visualization ---
+    # --- 4. Prepare for Visualization ---
     print("Preparing visualization data (colors, sizes)...")
     
     # We will only draw the largest connected component to make it cleaner
@@ -98,7 +67,7 @@ def full_analysis_and_visualization():
     print(f"Visualizing the largest connected component with {G_sub.number_of_nodes()} nodes.")
 
     # Get node attributes from the subgraph
-    # We already calculated these and set them on the graph
+    # The centrality stage calculated these and they were set on the graph above
     pagerank_values = nx.get_node_attributes(G_sub, 'PageRank')
     community_values = nx.get_node_attributes(G_sub, 'Community')
     
@@ -129,37 +98,39 @@ def full_analysis_and_visualization():
     
     node_sizes = [min_size + (pr - min_pr) * (max_size - min_size) / (max_pr - min_pr) if (max_pr - min_pr) > 0 else min_size for pr in pr_values]
 
-    # --- 7. Draw the Graph ---
+    # --- 5. Draw the Graph ---
     print("Drawing graph (this may take a few minutes for a large graph)...")
     
-    plt.figure(figsize=(20, 20))
-    
-    pos = nx.spring_layout(G_sub, k=0.1, iterations=50, seed=42)
-
-    nx.draw_networkx(
-        G_sub,
-        pos=pos,
-        node_color=node_colors,
-        node_size=node_sizes,
-        with_labels=False,
-        width=0.1,
-        alpha=0.7
+    pos = cached_layout(G_sub, spring_layout, "pagerank", k=0.1, iterations=50, seed=42)
+
+    # Rasterise a 20x20 inch, 300 dpi image straight into a pixel buffer
+    nodes = list(G_sub.nodes())
+    index = {node: i for i, node in enumerate(nodes)}
+    edges = np.array([(index[a], index[b]) for a, b in G_sub.edges()], dtype=np.int64).reshape(-1, 2)
+    image = render(
+        np.array([pos[node] for node in nodes]),
+        edges[:, 0], edges[:, 1],
+        20 * 300, 20 * 300,
+        node_colors=node_colors,
+        node_sizes=node_sizes,
+        dpi=300,
+        edge_width=0.1,
+        edge_alpha=0.7,
+        node_alpha=0.7
     )
 
-    plt.title("Co-Retweet Network Visualization (Sized by PageRank, Colored by Community)", fontsize=30)
-    plt.axis('off')
-    
-    plt.savefig("network_visualization.png", format="PNG", dpi=300, bbox_inches='tight')
+    save_image(image, "network_visualization.png", dpi=300, fontsize=30,
+               title="Co-Retweet Network Visualization (Sized by PageRank, Colored by Community)")
     
     print("\n--- Pipeline Complete ---")
     print(f"Successfully saved visualization to network_visualization.png")
 
-    # --- 8. Print Console Reports ---
+    # --- 6. Print Console Reports ---
     print("\n--- Top 10 Most Influential Users (by PageRank) ---")
     print(final_output_df[['retweeted_screen_name', 'PageRank', 'Weighted_Degree_Strength']].head(10))
 
 
 if __name__ == "__main__":
-    full_analysis_and_visualization()
+    full_analysis_and_visualization(parse_args())
 
 
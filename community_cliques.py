@@ -1,63 +1,205 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 import pandas as pd
 import networkx as nx
-import matplotlib.pyplot as plt
-import os
+import scipy.sparse as sp
+
+from cohesion_index import load_index
+from force_layout import spring_layout
+from graph_store import load_csr
+from layout_cache import cached_layout
+
+# community_cliques.py
+# Maximal-clique analysis per community on the co-retweet graph. The edge list is
+# loaded once as a memory-mapped CSR graph and the nodes are grouped by community
+# in one pass. A clique of min_size lies in the min_size-truss, so each community's
+# induced subgraph keeps only edges with that community truss number (from
+# cohesion_index.py) and is then pruned to its (min_size - 1)-core. Only this
+# residual graph is searched exhaustively, and the communities are processed in
+# parallel. Writes a per-community report, per-node clique membership and
+# (optionally) an image of each community with its largest clique highlighted.
+
+
+EDGE_FILE = "coretweet_edges.csv"
+NODES_FILE = "coretweet_nodes_with_communities_and_details.csv"
+REPORT_FILE = "community_cliques_report.csv"
+CLIQUE_NODES_FILE = "community_clique_nodes.csv"
+OUTPUT_DIR = "community_clique_images"
+MIN_SIZE = 3
+MAX_CLIQUES = 1_000_000
+
+_graph = None
+_ids = None
+
+
+def _init_worker(path):
+    # Each worker maps the shared CSR and index files once; the matrix holds
+    # community truss numbers instead of weights
+    global _graph, _ids
+    graph = load_csr(path)
+    _ids = graph.ids
+    index = load_index(path, rebuild=False)
+    n = len(graph.ids)
+    _graph = sp.csr_matrix((index.community_truss, graph.indices, graph.indptr), shape=(n, n))
+
+
+def community_index(graph, nodes_df):
+    # Vertex indices of every community, from one stable sort of the membership
+    community = nodes_df.drop_duplicates('Id').set_index('Id')['Community'].reindex(graph.ids)
+    known = np.flatnonzero(community.notna().to_numpy())
+    labels = community.to_numpy()[known].astype(np.int64)
+    order = np.argsort(labels, kind='stable')
+    keys, starts = np.unique(labels[order], return_index=True)
+    return dict(zip(keys.tolist(), np.split(known[order], starts[1:])))
+
+
+def k_core(A, k):
+    # Positions of the k-core of the (unweighted) symmetric matrix A, by repeated peeling
+    A = (A != 0).astype(np.int32).tocsr()
+    keep = np.arange(A.shape[0])
+    while len(keep):
+        degree = np.diff(A.indptr)
+        inner = degree >= k
+        if inner.all():
+            break
+        keep = keep[inner]
+        A = A[inner][:, inner]
+    return keep
+
+
+def find_cliques(task):
+    community, vertices, min_size, max_cliques, output_dir = task
+    sub = _graph[vertices][:, vertices]
+    max_truss = int(sub.data.max()) if sub.nnz else 0
+    sub.data[sub.data < min_size] = 0
+    sub.eliminate_zeros()
+    core = k_core(sub, min_size - 1)
+    G = nx.from_scipy_sparse_array(sub[core][:, core])
+
+    # Count, per core position, the maximal cliques it belongs to and their largest size
+    counts = np.zeros(len(core), dtype=np.int64)
+    largest_at = np.zeros(len(core), dtype=np.int64)
+    n_cliques, largest, truncated = 0, [], False
+    for clique in nx.find_cliques(G):
+        if len(clique) < min_size:
+            continue
+        if n_cliques == max_cliques:
+            truncated = True
+            break
+        n_cliques += 1
+        counts[clique] += 1
+        np.maximum.at(largest_at, clique, len(clique))
+        if len(clique) > len(largest):
+            largest = clique
+
+    members = vertices[core]
+    if output_dir:
+        plot_community(G, _ids[members], community, largest, output_dir)
 
-# --- 1. Load Data ---
-df = pd.read_csv("coretweet_nodes_with_communities_and_details.csv")
-
-# --- 2. Build Graph ---
-G = nx.Graph()
-
-# Add edges between user and retweeted_screen_name
-for _, row in df.iterrows():
-    if pd.notna(row['retweeted_screen_name']):
-        G.add_edge(row['Id'], row['retweeted_screen_name'], community=row['Community'])
-
-# --- 3. Prepare output directory ---
-output_dir = "community_clique_images"
-os.makedirs(output_dir, exist_ok=True)
-
-# --- 4. Analyze each community and save images ---
-communities = df['Community'].unique()
-
-for community in communities:
-    print(f"\n=== Community {community} ===")
-    
-    # Extract nodes in this community
-    community_nodes = set(df[df['Community'] == community]['Id'])
-    subG = G.subgraph(community_nodes | {n for u, v in G.edges() for n in (u, v)
-                                         if u in community_nodes or v in community_nodes})
-    
-    # Find cliques
-    cliques = list(nx.find_cliques(subG))
-    cliques_sorted = sorted(cliques, key=len, reverse=True)
-    
-    print(f"Number of cliques: {len(cliques_sorted)}")
-    if cliques_sorted:
-        print(f"Largest clique (size {len(cliques_sorted[0])}): {cliques_sorted[0]}")
-    
-    # --- 5. Visualize and Save ---
+    summary = {
+        'Community': community,
+        'nodes': len(vertices),
+        'core_nodes': len(core),
+        'core_edges': G.number_of_edges(),
+        'max_truss': max_truss,
+        'cliques': n_cliques,
+        'max_clique_size': len(largest),
+        'truncated': truncated,
+    }
+    per_node = (members, counts, largest_at, np.isin(np.arange(len(core)), largest))
+    return summary, per_node, vertices[core[largest]] if largest else np.empty(0, dtype=np.int64)
+
+
+def plot_community(G, ids, community, largest, output_dir):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    # Label by user ID so the cached layout survives changes to the community
+    G = nx.relabel_nodes(G, dict(enumerate(ids.tolist())))
     plt.figure(figsize=(8, 6))
-    pos = nx.spring_layout(subG, seed=42)
-    
+    pos = cached_layout(G, spring_layout, f"clique_community_{community}", seed=42)
+
     # Highlight nodes in largest clique
-    largest_clique = set(cliques_sorted[0]) if cliques_sorted else set()
-    node_colors = ['red' if node in largest_clique else 'skyblue' for node in subG.nodes()]
-    
-    nx.draw_networkx(subG, pos,
+    largest = set(ids[largest].tolist())
+    node_colors = ['red' if node in largest else 'skyblue' for node in G.nodes()]
+    nx.draw_networkx(G, pos,
                      with_labels=False,
                      node_color=node_colors,
                      node_size=80,
                      edge_color='gray',
                      alpha=0.7)
-    
+
     plt.title(f"Community {community} - Largest Clique Highlighted")
     plt.axis('off')
-    
-    # Save the figure
     file_path = os.path.join(output_dir, f"community_{community}_cliques.png")
     plt.savefig(file_path, bbox_inches='tight', dpi=300)
     plt.close()
-    
-    print(f"Saved clique visualization for community {community} to {file_path}")
+
+
+def analyze_cliques(nodes_df, path=EDGE_FILE, min_size=MIN_SIZE, max_cliques=MAX_CLIQUES,
+                    output_dir=OUTPUT_DIR, workers=None):
+    # Returns (per-community report, per-node clique membership)
+    graph = load_csr(path)
+    load_index(path)  # build or refresh before the workers map it
+    index = community_index(graph, nodes_df)
+    # Largest communities first so they don't end up last on a busy pool
+    tasks = sorted(((c, v, min_size, max_cliques, output_dir) for c, v in index.items()),
+                   key=lambda t: -len(t[1]))
+    workers = workers or min(len(tasks), os.cpu_count() or 1) or 1
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(path,)) as pool:
+        results = list(pool.map(find_cliques, tasks))
+
+    report, frames = [], []
+    for summary, (members, counts, largest_at, in_largest), clique in results:
+        summary['largest_clique'] = ' '.join(map(str, graph.ids[clique]))
+        report.append(summary)
+        frames.append(pd.DataFrame({
+            'Id': graph.ids[members],
+            'Community': summary['Community'],
+            'cliques': counts,
+            'max_clique_size': largest_at,
+            'in_largest_clique': in_largest,
+        }))
+    report = pd.DataFrame(report).sort_values('Community', ignore_index=True)
+    nodes = pd.concat(frames, ignore_index=True).sort_values(['Community', 'Id'], ignore_index=True)
+    return report, nodes
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Maximal cliques per community of the co-retweet graph")
+    parser.add_argument("--min-size", type=int, default=MIN_SIZE, help=f"smallest clique counted (default: {MIN_SIZE})")
+    parser.add_argument("--max-cliques", type=int, default=MAX_CLIQUES,
+                        help=f"stop enumerating a community after this many cliques (default: {MAX_CLIQUES})")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--no-images", action="store_true", help="skip the per-community images")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    nodes_df = pd.read_csv(NODES_FILE)
+    report, nodes = analyze_cliques(nodes_df, EDGE_FILE, args.min_size, args.max_cliques,
+                                    None if args.no_images else OUTPUT_DIR, args.workers)
+
+    for row in report.itertuples():
+        print(f"\n=== Community {row.Community} ===")
+        print(f"Residual graph: {row.core_nodes} of {row.nodes} nodes, {row.core_edges} edges "
+              f"(max truss {row.max_truss})")
+        print(f"Number of cliques: {row.cliques}{' (truncated)' if row.truncated else ''}")
+        if row.max_clique_size:
+            print(f"Largest clique (size {row.max_clique_size}): {row.largest_clique}")
+
+    report.to_csv(REPORT_FILE, index=False)
+    nodes.to_csv(CLIQUE_NODES_FILE, index=False)
+    print(f"\nSaved clique report to {REPORT_FILE} and node membership to {CLIQUE_NODES_FILE}")
+
+
+if __name__ == "__main__":
+    main()
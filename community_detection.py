@@ -0,0 +1,273 @@
+import argparse
+import os
+import random
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+from pathlib import Path
+
+import igraph as ig
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+
+from backbone import edge_file
+from graph_store import CSRGraph, edge_frame, load_csr, save_graph, to_igraph
+
+# community_detection.py
+# Multi-seed Louvain / Leiden with consensus partitions. Every (resolution, seed)
+# run happens in a process pool whose workers memory-map the same binary graph.
+# Per resolution the runs are combined into a consensus partition (Lancichinetti &
+# Fortunato 2012), whose re-clustering rounds go to the same pool, and the mean
+# modularity and pairwise NMI stability are reported.
+# update_communities() instead warm-starts from the previous membership and only
+# re-optimises the nodes touched by changed edges, then splits and merges the
+# communities around them.
+
+
+REPORT_FILE = "community_resolution_report.csv"
+SEEDS = 16
+RESOLUTIONS = [1.0]
+CONSENSUS_THRESHOLD = 0.5
+CONSENSUS_ROUNDS = 10
+
+_graph = None
+_consensus = (None, None)  # (path, igraph copy) of the last consensus graph a worker loaded
+
+
+def _init_worker(path):
+    # Each worker maps the shared CSR files once and keeps its own igraph copy
+    global _graph
+    _graph = to_igraph(load_csr(path))
+
+
+def _consensus_graph(path):
+    # Consensus rounds save a new graph per round; a worker loads each one once
+    global _consensus
+    if _consensus[0] != path:
+        _consensus = (path, to_igraph(load_csr(path, rebuild=False)))
+    return _consensus[1]
+
+
+def _run(task):
+    # task: (method, resolution, seed, path of a consensus graph or None for the shared one)
+    method, resolution, seed, path = task
+    g = _graph if path is None else _consensus_graph(path)
+    random.seed(seed)  # igraph draws from Python's random module
+    if method == "louvain":
+        membership = g.community_multilevel(weights="weight", resolution=resolution).membership
+    else:
+        membership = g.community_leiden(objective_function="modularity", weights="weight",
+                                        resolution=resolution, n_iterations=-1).membership
+    return np.asarray(membership, dtype=np.int32)
+
+
+def canonical(membership):
+    # Number communities by size (largest first), ties by lowest vertex index,
+    # so equal partitions always get equal IDs
+    membership = np.asarray(membership)
+    labels, first, sizes = np.unique(membership, return_index=True, return_counts=True)
+    order = np.lexsort((first, -sizes))
+    relabel = np.empty(len(labels), dtype=np.int32)
+    relabel[order] = np.arange(len(labels), dtype=np.int32)
+    return relabel[np.searchsorted(labels, membership)]
+
+
+def stability(memberships):
+    # Mean pairwise normalised mutual information between runs
+    if len(memberships) < 2:
+        return 1.0
+    return float(np.mean([ig.compare_communities(a.tolist(), b.tolist(), method="nmi")
+                          for a, b in combinations(memberships, 2)]))
+
+
+def consensus(g, memberships, method, resolution, pool, workdir, threshold=CONSENSUS_THRESHOLD,
+              rounds=CONSENSUS_ROUNDS):
+    # Re-cluster the graph of co-classification frequencies until every run agrees;
+    # each round's graph is saved to workdir and its runs go to the same pool
+    u, v = np.array(g.get_edgelist()).reshape(-1, 2).T
+    weights = np.asarray(g.es["weight"], dtype=np.float64)
+    n = g.vcount()
+    for i in range(rounds):
+        runs = np.stack(memberships)
+        together = (runs[:, u] == runs[:, v]).mean(axis=0)
+        if np.all((together == 0) | (together == 1)):
+            break
+        keep = together >= threshold
+        w = together[keep] * weights[keep]
+        A = sp.csr_matrix((np.r_[w, w], (np.r_[u[keep], v[keep]], np.r_[v[keep], u[keep]])), shape=(n, n))
+        A.sort_indices()
+        path = Path(workdir) / f"consensus_{resolution}_{i}.csv"
+        save_graph(CSRGraph(np.arange(n, dtype=np.int64), A.indptr.astype(np.int64),
+                            A.indices.astype(np.int32), A.data), path)
+        memberships = list(pool.map(_run, [(method, resolution, seed, path) for seed in range(len(runs))]))
+    return canonical(memberships[0])
+
+
+def detect_communities(path=None, method="louvain", resolutions=RESOLUTIONS, seeds=SEEDS, workers=None):
+    # Returns (consensus membership per resolution, report DataFrame); memberships
+    # are aligned with the vertices of to_igraph(load_csr(path))
+    path = path or edge_file()
+    g = to_igraph(load_csr(path))
+    tasks = [(method, r, s, None) for r in resolutions for s in range(seeds)]
+    workers = workers or min(len(tasks), os.cpu_count() or 1)
+
+    partitions, rows = {}, []
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(path,)) as pool, \
+            tempfile.TemporaryDirectory() as workdir:
+        runs = list(pool.map(_run, tasks))
+        for i, r in enumerate(resolutions):
+            memberships = runs[i * seeds:(i + 1) * seeds]
+            partitions[r] = consensus(g, memberships, method, r, pool, workdir)
+
+    for i, r in enumerate(resolutions):
+        memberships = runs[i * seeds:(i + 1) * seeds]
+        modularity = [g.modularity(m.tolist(), weights="weight", resolution=r) for m in memberships]
+        rows.append({
+            "method": method,
+            "resolution": r,
+            "runs": seeds,
+            "modularity_mean": np.mean(modularity),
+            "modularity_std": np.std(modularity),
+            "stability_nmi": stability(memberships),
+            "communities_mean": np.mean([m.max() + 1 for m in memberships]),
+            "consensus_communities": int(partitions[r].max()) + 1,
+            "consensus_modularity": g.modularity(partitions[r].tolist(), weights="weight", resolution=r),
+        })
+    return partitions, pd.DataFrame(rows)
+
+
+def changed_nodes(graph, previous_graph):
+    # IDs of nodes with an edge that was added, removed or re-weighted
+    merged = edge_frame(previous_graph).merge(edge_frame(graph), on=["source", "target"],
+                                              how="outer", suffixes=("_old", "_new"))
+    changed = merged[merged["weight_old"].fillna(0) != merged["weight_new"].fillna(0)]
+    return np.unique(changed[["source", "target"]].to_numpy(np.int64).ravel())
+
+
+def local_moves(graph, membership, queue, resolution=1.0, max_moves=None):
+    # Louvain's local-moving phase, restricted to the queued nodes: each node joins
+    # the neighbouring community with the best modularity gain, and the neighbours
+    # of a node that moved are queued in turn. Self-loops (the internal weight of an
+    # aggregated community) count towards strength but not towards any move.
+    indptr, indices = graph.indptr, graph.indices
+    weights = np.asarray(graph.weights, dtype=np.float64)
+    n = len(indptr) - 1
+    strength = np.bincount(np.repeat(np.arange(n), np.diff(indptr)), weights, minlength=n)
+    m2 = strength.sum()
+    totals = np.bincount(membership, strength, minlength=membership.max() + 1)
+
+    queued = np.zeros(len(membership), dtype=bool)
+    queued[queue] = True
+    queue = list(queue)
+    moves = 0
+    while queue and (max_moves is None or moves < max_moves):
+        i = queue.pop()
+        queued[i] = False
+        nbrs = indices[indptr[i]:indptr[i + 1]]
+        other = nbrs != i
+        nbrs = nbrs[other]
+        if not len(nbrs) or m2 == 0:
+            continue
+        own = membership[i]
+        totals[own] -= strength[i]
+        labels, inv = np.unique(membership[nbrs], return_inverse=True)
+        k_in = np.bincount(inv, weights[indptr[i]:indptr[i + 1]][other])
+        gains = k_in - resolution * strength[i] * totals[labels] / m2
+        own_gain = gains[labels == own][0] if own in labels else -resolution * strength[i] * totals[own] / m2
+        best = labels[np.argmax(gains)]
+        if gains.max() > own_gain + 1e-12 and best != own:
+            membership[i] = best
+            moves += 1
+            for j in nbrs[~queued[nbrs]]:
+                queued[j] = True
+                queue.append(j)
+        totals[membership[i]] += strength[i]
+    return membership, moves
+
+
+def split_disconnected(graph, membership, communities):
+    # Leiden's guarantee for the listed communities: each one that fell apart keeps
+    # its ID on its largest connected piece, and the other pieces get fresh IDs
+    n = len(membership)
+    rows = np.repeat(np.arange(n), np.diff(graph.indptr))
+    inside = np.isin(membership, communities)
+    keep = inside[rows] & (membership[rows] == membership[graph.indices])
+    A = sp.csr_matrix((np.ones(keep.sum()), (rows[keep], graph.indices[keep])), shape=(n, n))
+    _, component = connected_components(A, directed=False)
+
+    vertices = np.flatnonzero(inside)
+    pieces, first, sizes = np.unique(component[vertices], return_index=True, return_counts=True)
+    owner = membership[vertices[first]]
+    order = np.lexsort((-sizes, owner))
+    extra = np.r_[False, owner[order][1:] == owner[order][:-1]]  # all but each community's largest
+    relabel = np.full(len(pieces), -1, dtype=np.int64)
+    relabel[order[extra]] = membership.max() + 1 + np.arange(extra.sum())
+    new_ids = relabel[np.searchsorted(pieces, component[vertices])]
+    membership[vertices] = np.where(new_ids >= 0, new_ids, membership[vertices])
+    return membership, relabel[relabel >= 0]
+
+
+def merge_communities(graph, membership, communities, resolution=1.0):
+    # Louvain's aggregation step, one level: local moves over the graph of
+    # communities, starting from the listed ones, so whole communities can merge.
+    # A merged community takes its neighbour's ID.
+    n = len(membership)
+    labels, codes = np.unique(membership, return_inverse=True)
+    M = sp.csr_matrix((np.ones(n), (np.arange(n), codes)), shape=(n, len(labels)))
+    W = sp.csr_matrix((np.asarray(graph.weights, dtype=np.float64), graph.indices, graph.indptr), shape=(n, n))
+    C = (M.T @ W @ M).tocsr()
+    C.sort_indices()
+    aggregate = CSRGraph(labels, C.indptr, C.indices, C.data)
+    queue = np.searchsorted(labels, communities[np.isin(communities, labels)])
+    merged, moves = local_moves(aggregate, np.arange(len(labels)), queue, resolution)
+    return labels[merged][codes], moves
+
+
+def update_communities(path, previous_nodes, previous_graph, resolution=1.0):
+    # Warm start from the previous Id -> Community table. Existing nodes keep their
+    # community IDs; new nodes start as singletons with fresh IDs. The touched nodes
+    # are re-optimised by local moves, then the communities they left or joined are
+    # split into connected pieces and offered merges with their neighbours (one
+    # aggregation level). A full run (without --incremental) still finds a better
+    # optimum now and then, as changes elsewhere never revisit untouched
+    # communities. Returns a membership aligned with the vertices of
+    # to_igraph(load_csr(path)).
+    graph = load_csr(path)
+    previous = previous_nodes.set_index("Id")["Community"].reindex(graph.ids)
+    new = previous.isna().to_numpy()
+    membership = previous.fillna(-1).to_numpy(np.int64)
+    next_id = int(previous_nodes["Community"].max()) + 1 if len(previous_nodes) else 0
+    membership[new] = np.arange(next_id, next_id + new.sum())
+
+    touched = np.isin(graph.ids, changed_nodes(graph, previous_graph)) | new
+    queue = np.flatnonzero(touched)
+    before = membership.copy()
+    membership, moves = local_moves(graph, membership, queue, resolution)
+    moved = touched | (membership != before)
+    affected = np.unique(np.r_[before[moved], membership[moved]])
+    membership, pieces = split_disconnected(graph, membership, affected)
+    membership, merges = merge_communities(graph, membership, np.r_[affected, pieces], resolution)
+    print(f"Incremental update: {len(queue)} touched nodes ({new.sum()} new), {moves} moves, "
+          f"{len(pieces)} split off, {merges} merged")
+    return membership
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Multi-seed community detection with consensus partitions")
+    parser.add_argument("--method", choices=["louvain", "leiden"], default="louvain")
+    parser.add_argument("--seeds", type=int, default=SEEDS, help=f"runs per resolution (default: {SEEDS})")
+    parser.add_argument("--resolutions", type=float, nargs="+", default=RESOLUTIONS,
+                        help="resolution sweep, e.g. 0.5 1.0 1.5")
+    parser.add_argument("--workers", type=int, default=None)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    _, report = detect_communities(method=args.method, resolutions=args.resolutions,
+                                   seeds=args.seeds, workers=args.workers)
+    print(report.to_string(index=False))
+    report.to_csv(REPORT_FILE, index=False)
+    print(f"Saved resolution report to {REPORT_FILE}")
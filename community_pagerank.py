@@ -0,0 +1,107 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from backbone import edge_file
+from community_stats import community_codes, membership_of
+from graph_store import load_csr
+from pagerank import ALPHA, DTYPES, METHOD_HELP, METHODS, MAX_ITER, SOLVERS, TOL, transition_matrix
+
+# community_pagerank.py
+# The most influential users inside each community: personalized PageRank with
+# the random walk teleporting to the community's own members, for every
+# community at once. The teleport vectors are stacked into an n x C matrix and
+# pagerank.py iterates them as one block, so each pass streams the transition
+# matrix once for all C communities instead of once per nx.pagerank call. Blocks
+# are capped at BATCH_ENTRIES matrix entries, and each block is reduced to its
+# communities' top-k members by personalized rank before the next one, so the
+# full n x C matrix is never held. The top members are written to one CSV.
+
+
+NODES_FILE = "coretweet_nodes_with_communities_and_details.csv"
+TOP_FILE = "community_pagerank_top.csv"
+TOP_K = 10
+BATCH_ENTRIES = 1 << 24  # entries of the n x C rank matrix per block
+
+
+def teleport_matrix(codes, k, dtype=np.float64):
+    # n x k: column c uniform over the members of community c
+    n = len(codes)
+    members = np.flatnonzero(codes >= 0)
+    V = np.zeros((n, k), dtype=dtype)
+    V[members, codes[members]] = 1.0
+    return V / np.maximum(V.sum(axis=0), 1)
+
+
+def top_members(ranks, groups, k=TOP_K):
+    # (vertices, values) of the k members with the highest rank in each column of
+    # a block of ranks; groups[j] holds the members of column j's community
+    top, values = [], []
+    for j, members in enumerate(groups):
+        r = ranks[members, j]
+        best = np.argpartition(-r, k - 1)[:k] if len(members) > k else np.arange(len(members))
+        best = best[np.lexsort((members[best], -r[best]))]
+        top.append(members[best])
+        values.append(r[best])
+    return top, values
+
+
+def community_pagerank(graph, membership, k=TOP_K, alpha=ALPHA, tol=TOL, max_iter=MAX_ITER, method="power",
+                       dtype=np.float64):
+    # (top, communities, iterations): Community, Rank, Id and personalized
+    # PageRank (teleporting to the community's members) of each community's
+    # top-k members, the number of communities and the most iterations any block
+    # needed. Only one block of ranks is held at a time.
+    labels, codes = community_codes(membership)
+    n, c = len(codes), len(labels)
+    order = np.argsort(codes, kind="stable")
+    groups = np.split(order, np.searchsorted(codes[order], np.arange(c)))[1:]
+    PT, dangling = transition_matrix(graph, dtype=dtype)
+    solve = SOLVERS[method]
+    per_block = max(1, BATCH_ENTRIES // max(n, 1))
+    rows, iterations = [], 0
+    for first in range(0, c, per_block):
+        block = np.arange(first, min(c, first + per_block))
+        V = teleport_matrix(np.where(np.isin(codes, block), codes - first, -1), len(block), dtype)
+        result = solve(PT, dangling, alpha, tol, max_iter, teleport=V)
+        iterations = max(iterations, result.iterations)
+        for label, top, values in zip(labels[block], *top_members(result.values, groups[first:first + len(block)], k)):
+            rows.append(pd.DataFrame({
+                'Community': label,
+                'Rank': np.arange(1, len(top) + 1),
+                'Id': np.asarray(graph.ids)[top],
+                'Personalized_PageRank': values,
+            }))
+    return pd.concat(rows, ignore_index=True), c, iterations
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Top users of every community by personalized PageRank")
+    parser.add_argument("--edges", help="edge CSV (default: the backbone if it is up to date, else all co-retweets)")
+    parser.add_argument("--nodes", default=NODES_FILE)
+    parser.add_argument("--top", type=int, default=TOP_K, help=f"members listed per community (default: {TOP_K})")
+    parser.add_argument("--method", choices=METHODS, default="power", help=METHOD_HELP)
+    parser.add_argument("--dtype", choices=DTYPES, default="float64")
+    parser.add_argument("--alpha", type=float, default=ALPHA, help=f"damping factor (default: {ALPHA})")
+    parser.add_argument("--tol", type=float, default=TOL, help=f"per-vertex tolerance (default: {TOL})")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    graph = load_csr(args.edges or edge_file())
+    nodes_df = pd.read_csv(args.nodes)
+    membership = membership_of(graph, nodes_df)
+    top, communities, iterations = community_pagerank(graph, membership, args.top, args.alpha, args.tol,
+                                                      method=args.method, dtype=np.dtype(args.dtype))
+    if 'retweeted_screen_name' in nodes_df.columns:
+        names = nodes_df.drop_duplicates('Id').set_index('Id')['retweeted_screen_name']
+        top.insert(3, 'retweeted_screen_name', names.reindex(top['Id']).to_numpy())
+    top.to_csv(TOP_FILE, index=False)
+    print(f"Personalized PageRank of {communities} communities in {iterations} iterations; "
+          f"top {args.top} of each saved to {TOP_FILE}")
+
+
+if __name__ == "__main__":
+    main()
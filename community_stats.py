@@ -0,0 +1,127 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from graph_store import edge_arrays, load_csr
+
+# community_stats.py
+# Edge statistics of every community from one pass over the CSR edge arrays. Each
+# edge is mapped to its pair of communities and summed into a communities x
+# communities mixing matrix (diagonal: edges inside a community, off-diagonal:
+# edges between two, both counted once). Internal / external edges and weights,
+# conductance and density are read off that matrix; average clustering comes from
+# per-vertex triangle counts on the graph of intra-community edges. Vertices
+# without a community (-1) belong to no row but still count as the outside of the
+# communities they touch.
+
+
+EDGE_FILE = "coretweet_edges.csv"
+NODES_FILE = "coretweet_nodes_with_communities.csv"
+STATS_FILE = "community_stats.csv"
+MIXING_FILE = "community_mixing.csv"
+
+
+def membership_of(graph, nodes_df):
+    # Community of every graph vertex (-1 for vertices missing from the node CSV)
+    community = nodes_df.drop_duplicates('Id').set_index('Id')['Community'].reindex(graph.ids)
+    return community.fillna(-1).to_numpy(np.int64)
+
+
+def community_codes(membership):
+    # (labels, codes): the sorted community labels and each vertex's row in them,
+    # -1 for vertices without a community
+    known = membership >= 0
+    labels, codes = np.unique(membership[known], return_inverse=True)
+    index = np.full(len(membership), -1, dtype=np.int64)
+    index[known] = codes
+    return labels, index
+
+
+def mixing_matrix(cu, cv, values, k):
+    # Symmetric k x k sums of values over edges between communities cu and cv; an
+    # edge inside a community is counted once on the diagonal
+    off = cu != cv
+    rows, cols = np.r_[cu, cv[off]], np.r_[cv, cu[off]]
+    return sp.coo_matrix((np.r_[values, values[off]], (rows, cols)), shape=(k, k)).toarray()
+
+
+def average_clustering(graph, index, k):
+    # Mean local clustering of the members of each community within its own
+    # subgraph, over members with at least two neighbours there (as igraph's
+    # transitivity_avglocal_undirected); NaN for a community without any
+    n = len(index)
+    u, v, _ = edge_arrays(graph)
+    inside = (index[u] == index[v]) & (index[u] >= 0)
+    u, v = u[inside], v[inside]
+    B = sp.csr_matrix((np.ones(2 * len(u), dtype=np.int32), (np.r_[u, v], np.r_[v, u])), shape=(n, n))
+    degree = np.diff(B.indptr).astype(np.float64)
+    triangles = np.asarray((B @ B).multiply(B).sum(axis=1)).ravel() / 2
+    counted = degree >= 2
+    local = 2 * triangles[counted] / (degree[counted] * (degree[counted] - 1))
+    total = np.bincount(index[counted], local, minlength=k)
+    members = np.bincount(index[counted], minlength=k)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return total / members
+
+
+def community_stats(graph, membership):
+    # (stats, mixing): one row of edge statistics per community, and the weighted
+    # mixing matrix as a DataFrame indexed by community on both axes
+    labels, index = community_codes(membership)
+    k = len(labels)
+    u, v, w = edge_arrays(graph)
+    w = w.astype(np.float64)
+    cu, cv = index[u], index[v]
+
+    # Edges to vertices without a community go to an extra last row / column
+    outside = np.where(cu < 0, k, cu), np.where(cv < 0, k, cv)
+    weights = mixing_matrix(*outside, w, k + 1)
+    counts = mixing_matrix(*outside, np.ones(len(u)), k + 1)
+
+    members = np.bincount(index[index >= 0], minlength=k).astype(np.float64)
+    internal_edges, internal_weight = counts.diagonal()[:k], weights.diagonal()[:k]
+    external_edges = counts[:k].sum(axis=1) - internal_edges
+    external_weight = weights[:k].sum(axis=1) - internal_weight
+
+    # Conductance: weight leaving the community over the smaller side's volume
+    volume = 2 * internal_weight + external_weight
+    rest = 2 * w.sum() - volume
+    with np.errstate(invalid="ignore", divide="ignore"):
+        conductance = external_weight / np.minimum(volume, rest)
+        density = internal_edges / (members * (members - 1) / 2)
+
+    stats = pd.DataFrame({
+        'Community': labels,
+        'Members': members.astype(np.int64),
+        'Internal_Edges': internal_edges.astype(np.int64),
+        'External_Edges': external_edges.astype(np.int64),
+        'Internal_Weight': internal_weight,
+        'External_Weight': external_weight,
+        'Conductance': conductance,
+        'Density': density,
+        'Avg_Clustering': average_clustering(graph, index, k),
+    })
+    mixing = pd.DataFrame(weights[:k, :k], index=pd.Index(labels, name='Community'), columns=labels)
+    return stats, mixing
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Edge statistics and mixing matrix of every community")
+    parser.add_argument("--edges", default=EDGE_FILE)
+    parser.add_argument("--nodes", default=NODES_FILE)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    graph = load_csr(args.edges)
+    stats, mixing = community_stats(graph, membership_of(graph, pd.read_csv(args.nodes)))
+    stats.to_csv(STATS_FILE, index=False)
+    mixing.to_csv(MIXING_FILE)
+    print(f"Saved statistics of {len(stats)} communities to {STATS_FILE} and {MIXING_FILE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+import networkx as nx
+import matplotlib.pyplot as plt
+
+from backbone import edge_file
+from community_stats import community_codes, membership_of, mixing_matrix
+from force_layout import forceatlas2_layout
+from graph_store import edge_arrays, load_csr
+from layout_cache import cached_layout
+from raster import render, save_image, to_pixels
+
+# community_supergraph.py
+# Collapses the co-retweet graph into one node per community: node size is the
+# member count, edge weight the summed co-retweet weight between two communities.
+# The aggregation is community_stats' mixing matrix, one pass over the edge
+# arrays. The overview image is drawn from the supergraph; --community c drills
+# into the induced subgraph of one community.
+
+
+NODES_FILE = "coretweet_nodes_with_communities.csv"
+SUPER_NODES_FILE = "community_supergraph_nodes.csv"
+SUPER_EDGES_FILE = "community_supergraph_edges.csv"
+DPI = 200
+
+
+def supergraph(graph, membership):
+    # (nodes, edges) DataFrames: members and internal weight per community, and the
+    # summed weight between every connected pair of communities
+    labels, index = community_codes(membership)
+    k = len(labels)
+    u, v, w = edge_arrays(graph)
+    keep = (index[u] >= 0) & (index[v] >= 0)
+    W = mixing_matrix(index[u][keep], index[v][keep], w[keep].astype(np.float64), k)
+
+    nodes = pd.DataFrame({
+        'Community': labels,
+        'Members': np.bincount(index[index >= 0], minlength=k),
+        'Internal_Weight': W.diagonal(),
+    })
+    rows, cols = np.nonzero(np.triu(W, k=1))
+    edges = pd.DataFrame({'source': labels[rows], 'target': labels[cols], 'weight': W[rows, cols]})
+    return nodes, edges
+
+
+def community_colors(labels):
+    cmap = plt.get_cmap("tab20", max(3, len(labels)))
+    return {c: cmap(i % cmap.N) for i, c in enumerate(sorted(labels))}
+
+
+def render_supergraph(nodes, edges, path="community_supergraph.png"):
+    # Raw weights run into the thousands and would pull everything onto one line;
+    # the layout sees them relative to the heaviest edge
+    weights = edges['weight'].to_numpy(np.float64)
+    G = nx.Graph()
+    G.add_nodes_from(nodes['Community'].tolist())
+    G.add_weighted_edges_from(zip(edges['source'], edges['target'], weights / max(weights.max(initial=0), 1)))
+    pos = cached_layout(G, forceatlas2_layout, "supergraph", max_iter=500, weight="weight", seed=42)
+
+    order = nodes['Community'].tolist()
+    index = {c: i for i, c in enumerate(order)}
+    xy = np.array([pos[c] for c in order])
+    members = nodes['Members'].to_numpy(np.float64)
+    sizes = 200 + 2800 * members / members.max()
+    colors = community_colors(order)
+
+    width, height = 10 * DPI, 10 * DPI
+    image = render(xy, edges['source'].map(index).to_numpy(), edges['target'].map(index).to_numpy(),
+                   width, height, [colors[c] for c in order], sizes, dpi=DPI, edge_alpha=0.5,
+                   edge_width=0.5 + 7.5 * np.sqrt(weights / max(weights.max(initial=0), 1)),
+                   outline_color="black", outline_width=0.5, margin=0.12)
+    px, py = to_pixels(xy, width, height, margin=0.12)
+    labels = [(x, y, f"{c}\n{m}") for x, y, c, m in zip(px, py, order, nodes['Members'])]
+    save_image(image, path, dpi=DPI, title="Community supergraph (size: members, edges: co-retweet weight)",
+               labels=labels)
+    return path
+
+
+def render_community(graph, membership, community, path=None):
+    # The induced subgraph of one community, nodes sized by internal strength
+    path = path or f"community_{community}.png"
+    members = np.flatnonzero(membership == community)
+    local = np.full(len(membership), -1, dtype=np.int64)
+    local[members] = np.arange(len(members))
+    u, v, w = edge_arrays(graph)
+    keep = (local[u] >= 0) & (local[v] >= 0)
+    lu, lv, w = local[u][keep], local[v][keep], w[keep]
+
+    names = graph.ids[members].astype(str)
+    G = nx.Graph()
+    G.add_nodes_from(names.tolist())
+    G.add_edges_from(zip(names[lu].tolist(), names[lv].tolist()))
+    pos = cached_layout(G, forceatlas2_layout, f"community_{community}", max_iter=300, scaling_ratio=1, seed=42)
+
+    strength = np.bincount(lu, w, len(members)) + np.bincount(lv, w, len(members))
+    sizes = 20 + 280 * strength / max(strength.max(), 1)
+    xy = np.array([pos[name] for name in names])
+    image = render(xy, lu, lv, 10 * DPI, 10 * DPI, community_colors([community])[community], sizes, dpi=DPI,
+                   edge_alpha=0.3, edge_width=0.6, outline_color="black", outline_width=0.3)
+    save_image(image, path, dpi=DPI, title=f"Community {community}: {len(members)} members, {len(lu)} edges")
+    return path
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Community supergraph and per-community drill-down images")
+    parser.add_argument("--community", type=int, nargs="+", help="also render these communities in full")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    graph = load_csr(edge_file())
+    membership = membership_of(graph, pd.read_csv(NODES_FILE))
+
+    nodes, edges = supergraph(graph, membership)
+    nodes.to_csv(SUPER_NODES_FILE, index=False)
+    edges.to_csv(SUPER_EDGES_FILE, index=False)
+    print(f"Supergraph: {len(nodes)} communities, {len(edges)} inter-community edges "
+          f"-> {SUPER_NODES_FILE}, {SUPER_EDGES_FILE}")
+    print(f"Saved {render_supergraph(nodes, edges)}")
+
+    for community in args.community or []:
+        print(f"Saved {render_community(graph, membership, community)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,45 +1,96 @@
-import igraph as ig
+import argparse
+import functools
+import os
 import pandas as pd
 import numpy as np
 from collections import Counter
 import matplotlib.pyplot as plt
 
+from approx_centrality import add_sampling_args
+from centrality import centrality_files, load_centrality
+from community_stats import MIXING_FILE, STATS_FILE, community_stats, membership_of
+from graph_store import load_csr, to_igraph
+from metrics_cache import cached
+from path_stats import (EXACT_NODES, MIN_BUDGET, SAMPLES as PATH_SAMPLES, bfs_budget, diameter, giant_component,
+                        mean_path_length)
+
+parser = argparse.ArgumentParser(description="Structure, centrality and community metrics of the co-retweet network")
+parser.add_argument("--path-samples", type=int,
+                    help=f"sampled BFS for the average path length (default: exact up to {EXACT_NODES} nodes)")
+parser.add_argument("--diameter-budget", type=bfs_budget,
+                    help=f"report diameter bounds after at most this many BFS (at least {MIN_BUDGET})")
+args = add_sampling_args(parser).parse_args()
+
 # Load csv's
 
-nodes_df = pd.read_csv("coretweet_nodes_with_communities.csv")   # columns: Id, Community
-edges_df = pd.read_csv("coretweet_edges.csv")   # columns: source, target, weight
+EDGE_FILE = "coretweet_edges.csv"
+NODE_FILE = "coretweet_nodes_with_communities.csv"   # columns: Id, Community
+nodes_df = pd.read_csv(NODE_FILE)
 
 
-# --- Build graph ---
-g = ig.Graph.DataFrame(
-    edges_df,
-    directed=False,
-    vertices=nodes_df.rename(columns={"Id": "name"}),  # igraph expects 'name' for vertex id
-    use_vids=False
-)
+# --- Build graph from the binary CSR copy of coretweet_edges.csv ---
+graph = load_csr(EDGE_FILE)
+
+
+# Every metric below goes through the metrics cache (keyed by the content of the
+# input CSVs and the options that change it), so a re-run on unchanged data only
+# loads arrays; the igraph copy is only built when something has to be computed
+@functools.cache
+def igraph_graph():
+    return to_igraph(graph)
+
 
-# --- Attach community info ---
-g.vs["community"] = nodes_df["Community"]
+def structure():
+    g = igraph_graph()
+    return {"vertices": g.vcount(), "edges": g.ecount(), "density": g.density(),
+            "degrees": np.array(g.degree()), "transitivity": g.transitivity_undirected()}
+
+
+basic = cached("structure", structure, inputs=[EDGE_FILE])
 
 print("=== BASIC NETWORK STRUCTURE ===")
-print(f"Number of vertices (nodes): {g.vcount()}")
-print(f"Number of edges: {g.ecount()}")
-print(f"Network density: {g.density():.4f}")
-
-# Diameter and average path length (might be slow on very large networks)
-if g.is_connected():
-    print(f"Network diameter: {g.diameter()}")
-    print(f"Average path length: {g.average_path_length():.2f}")
+print(f"Number of vertices (nodes): {basic['vertices']}")
+print(f"Number of edges: {basic['edges']}")
+print(f"Network density: {basic['density']:.4f}")
+
+# Diameter and average path length: exact on small graphs, otherwise (or with
+# --path-samples) iFUB diameter bounds and a sampled-BFS average path length
+A, giant_vertices = giant_component(graph)
+connected = len(giant_vertices) == basic["vertices"]
+exact = len(giant_vertices) <= EXACT_NODES and not args.path_samples
+
+
+def path_lengths():
+    if exact:
+        g = igraph_graph()
+        giant = g if connected else g.induced_subgraph(giant_vertices.tolist())
+        d = giant.diameter()
+        return {"lower": d, "upper": d, "bfs": 0, "mean": giant.average_path_length(), "error": 0.0, "samples": 0}
+    d = diameter(A, args.diameter_budget)
+    apl = mean_path_length(A, args.path_samples or PATH_SAMPLES, args.seed)
+    return {**d._asdict(), **apl._asdict()}
+
+
+# Unseeded samples differ every run, so they are not cached
+paths = cached("paths", path_lengths, inputs=[EDGE_FILE], exact=exact, samples=args.path_samples,
+               budget=args.diameter_budget, seed=None if exact else args.seed) if exact or args.seed is not None else path_lengths()
+label, suffix = ("Network diameter", "") if connected else ("Diameter", " (giant component)")
+if not connected:
+    print(f"Network not connected; giant component size: {len(giant_vertices)}")
+if exact:
+    print(f"{label}{suffix}: {paths['lower']}")
+    print(f"Average path length{suffix}: {paths['mean']:.2f}")
 else:
-    giant = g.clusters().giant()
-    print(f"Network not connected; giant component size: {giant.vcount()}")
-    print(f"Diameter (giant component): {giant.diameter()}")
-    print(f"Average path length (giant component): {giant.average_path_length():.2f}")
+    bounds = f"{paths['lower']}" if paths["lower"] == paths["upper"] else \
+        f"between {paths['lower']} and {paths['upper']}"
+    print(f"{label}{suffix}: {bounds} ({paths['bfs']} BFS)")
+    print(f"Average path length{suffix}: {paths['mean']:.2f} ± {paths['error']:.2f} "
+          f"({paths['samples']} BFS sources)")
 
 
 
 # Get degrees
-degrees = np.array(g.degree())
+degrees = basic["degrees"]
 counts, bins = np.histogram(degrees, bins=15)
 print("\n=== DEGREE DISTRIBUTION ===")
 for i in range(len(counts)):
@@ -76,59 +127,67 @@ plt.tight_layout()
 
 
 print("\n=== CENTRALITY MEASURES ===")
-deg_cent = g.degree()
-close_cent = g.closeness()
-bet_cent = g.betweenness()
-eig_cent = g.eigenvector_centrality()
-pagerank = g.pagerank()
-
-
-def top_n(metric, n=5, label="metric"):
-    top = np.argsort(metric)[-n:][::-1]
-    for i in top:
-        print(f"  {g.vs[i]['name']} — {label}: {metric[i]:.4f}")
+# From the centrality stage, shared with communities_pagerank.py: every measure is
+# computed once, in parallel, and only recomputed when the graph or nodes change
+centrality = load_centrality(EDGE_FILE, samples=args.samples, epsilon=args.epsilon, delta=args.delta,
+                             workers=args.workers, seed=args.seed)
+_, intervals_file = centrality_files(EDGE_FILE)
+intervals = pd.read_csv(intervals_file, dtype={"Id": str}).set_index("Id") if os.path.exists(intervals_file) else None
+
+
+def top_n(column, n=5, label="metric"):
+    top = centrality.nlargest(n, column)
+    for node, value in zip(top["Id"], top[column]):
+        margin = ""
+        if intervals is not None and f"{column}_Low" in intervals.columns:
+            low, high = intervals.loc[node, [f"{column}_Low", f"{column}_High"]]
+            margin = f" (95% CI {low:.4f} - {high:.4f})"
+        print(f"  {node} — {label}: {value:.4f}{margin}")
 
 print("Top 5 Degree Centrality:")
-top_n(deg_cent, label="degree")
+top_n("Degree", label="degree")
 print("Top 5 Closeness Centrality:")
-top_n(close_cent, label="closeness")
+top_n("Closeness", label="closeness")
 print("Top 5 Betweenness Centrality:")
-top_n(bet_cent, label="betweenness")
+top_n("Betweenness", label="betweenness")
 print("Top 5 Eigenvector Centrality:")
-top_n(eig_cent, label="eigenvector")
+top_n("Eigenvector", label="eigenvector")
 
 
 print("\n=== COMMUNITY STRUCTURE ===")
-comms = g.vs["community"]
-num_comms = len(set(comms))
+comms = membership_of(graph, nodes_df).tolist()   # -1 for nodes without one
+unassigned = comms.count(-1)
+num_comms = len(set(comms) - {-1})
 print(f"Number of communities: {num_comms}")
+if unassigned:
+    print(f"Nodes without a community: {unassigned}")
 
 # Count nodes per community
-comm_counts = Counter(comms)
+comm_counts = Counter(c for c in comms if c != -1)
 print("Top 10 largest communities:")
 for c, count in comm_counts.most_common(10):
     print(f"  Community {c}: {count} nodes")
 
-# Internal vs external edges per community
+# Edge statistics of every community in one pass over the edge arrays
+communities = cached("communities", lambda: dict(zip(("stats", "mixing"), community_stats(graph, np.array(comms)))),
+                     inputs=[EDGE_FILE, NODE_FILE])
+stats, mixing = communities["stats"], communities["mixing"]
+stats.to_csv(STATS_FILE, index=False)
+mixing.to_csv(MIXING_FILE)
+top = stats.set_index("Community").loc[[c for c, _ in comm_counts.most_common(10) if c in set(stats["Community"])]]
+
 print("\nInternal vs External Edges per Community, sorted by size:")
-for c, _ in comm_counts.most_common(10):
-    nodes_in_comm = [v.index for v in g.vs if v["community"] == c]
-    sub = g.subgraph(nodes_in_comm)
-    internal = sub.ecount()
-    total = sum(1 for e in g.es if (g.vs[e.source]["community"] == c) or (g.vs[e.target]["community"] == c))
-    external = total - internal
-    print(f"  Community {c}: {internal} internal, {external} external edges")
+for row in top.itertuples():
+    print(f"  Community {row.Index}: {row.Internal_Edges} internal, {row.External_Edges} external edges")
 
 print("\nAverage Clustering Coefficient per Community:")
-for c, _ in comm_counts.most_common(10):
-    nodes_in_comm = [v.index for v in g.vs if v['community'] == c]
-    subgraph = g.subgraph(nodes_in_comm)
-    avg_clust = subgraph.transitivity_avglocal_undirected()
-    print(f"Community {c}: {avg_clust}")
+for row in top.itertuples():
+    print(f"Community {row.Index}: {row.Avg_Clustering}")
+print(f"Statistics of all {len(stats)} communities saved to {STATS_FILE}, mixing matrix to {MIXING_FILE}")
 
 print("\n=== STRUCTURAL FEATURES ===")
 # Clustering coefficient (transitivity)
-print(f"Average clustering coefficient: {g.transitivity_undirected():.4f}")
+print(f"Average clustering coefficient: {basic['transitivity']:.4f}")
 
 plt.show()
 
@@ -0,0 +1,109 @@
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from co_retweets_edges import CSV_FILE, TOP_AUTHORS, edges_from_projection, top_author_ids
+from retweet_stream import iter_retweet_chunks
+
+# coretweet_snapshots.py
+# Co-retweet edge lists for sliding or tumbling time windows. The window is
+# advanced by `step`; retweets entering and leaving it update a retweeter x
+# author multiplicity matrix, and the pair weights are corrected only for the
+# retweeters whose author set changed, instead of re-projecting every window.
+
+
+SNAPSHOT_DIR = "coretweet_snapshots"
+INDEX_FILE = "snapshots.csv"
+
+
+def load_timed_retweets(csv_file=CSV_FILE):
+    cols = ["author_id", "retweet_author_id", "created_at"]
+    df = pd.concat(iter_retweet_chunks(cols, csv_file), ignore_index=True)
+    df["created_at"] = pd.to_datetime(df["created_at"], utc=True)
+    df = df.dropna().astype({"author_id": "int64", "retweet_author_id": "int64"})
+    return df.sort_values("created_at", kind="stable", ignore_index=True)
+
+
+def events_matrix(r_codes, a_codes, shape):
+    # Retweet multiplicities per (retweeter, author) for a slice of events
+    return sp.csr_matrix((np.ones(len(r_codes), dtype=np.int64), (r_codes, a_codes)), shape=shape)
+
+
+def gram(B):
+    return (B.T @ B).tocsr()
+
+
+def iter_snapshots(df, window, step, top=TOP_AUTHORS):
+    # Yield (window_start, window_end, edges_df) for each window position.
+    # Authors are the top-N over the whole period so node sets stay comparable.
+    author_ids = np.sort(top_author_ids(df["retweet_author_id"].value_counts(), top))
+    df = df[df["retweet_author_id"].isin(author_ids)]
+    r_codes, _ = pd.factorize(df["author_id"])
+    a_codes = np.searchsorted(author_ids, df["retweet_author_id"].to_numpy())
+    times = df["created_at"].dt.tz_convert(None).to_numpy()
+    shape = (r_codes.max() + 1 if len(r_codes) else 0, len(author_ids))
+
+    M = sp.csr_matrix(shape, dtype=np.int64)   # retweets per pair inside the window
+    W = sp.csr_matrix((len(author_ids),) * 2, dtype=np.int64)   # B^T B of the window
+
+    first = df["created_at"].iloc[0].floor(step) if len(df) else None
+    last = df["created_at"].iloc[-1] if len(df) else None
+    start, lo, hi = first, 0, 0
+    while first is not None and start <= last:
+        end = start + window
+        new_lo = np.searchsorted(times, start.tz_convert(None).to_datetime64(), side="left")
+        new_hi = np.searchsorted(times, end.tz_convert(None).to_datetime64(), side="left")
+
+        # The window moves from events [lo, hi) to [new_lo, new_hi); only the
+        # retweets that enter or leave it change the multiplicities
+        enter = slice(max(hi, new_lo), new_hi)
+        leave = slice(lo, min(new_lo, hi))
+        delta = events_matrix(r_codes[enter], a_codes[enter], shape) \
+            - events_matrix(r_codes[leave], a_codes[leave], shape)
+
+        touched = np.unique(delta.tocoo().row)
+        if len(touched):
+            before = M[touched]
+            M = M + delta
+            M.eliminate_zeros()
+            after = M[touched]
+            before.data[:] = 1
+            after.data[:] = 1
+            W = W + gram(after) - gram(before)
+
+        W.eliminate_zeros()
+        yield start, end, edges_from_projection(sp.triu(W, k=1).tocoo(), author_ids)
+        start, lo, hi = start + step, new_lo, new_hi
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Co-retweet edge lists over sliding time windows")
+    parser.add_argument("--window", default="7D", help="window length as a pandas offset (default: 7D)")
+    parser.add_argument("--step", default="1D",
+                        help="distance between window starts; equal to --window for tumbling windows (default: 1D)")
+    parser.add_argument("--top", type=int, default=TOP_AUTHORS, help="authors kept over the whole period, 0 for all")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    window, step = pd.Timedelta(args.window), pd.Timedelta(args.step)
+
+    print("Loading retweets with timestamps...")
+    retweets = load_timed_retweets()
+
+    out_dir = Path(SNAPSHOT_DIR)
+    out_dir.mkdir(exist_ok=True)
+    index = []
+    for start, end, edges_df in iter_snapshots(retweets, window, step, args.top or None):
+        path = out_dir / f"coretweet_edges_{start:%Y-%m-%dT%H%M}.csv"
+        edges_df.to_csv(path, index=False)
+        index.append({"window_start": start, "window_end": end, "edges": len(edges_df),
+                      "total_weight": int(edges_df["weight"].sum()), "file": path.name})
+        print(f"  {start:%Y-%m-%d %H:%M} - {end:%Y-%m-%d %H:%M}: {len(edges_df)} edges")
+
+    pd.DataFrame(index).to_csv(out_dir / INDEX_FILE, index=False)
+    print(f"Saved {len(index)} snapshots to {out_dir}")
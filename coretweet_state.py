@@ -0,0 +1,187 @@
+import argparse
+import json
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+import retweet_stream
+from graph_store import write_graph
+from co_retweets_edges import CSV_FILE, EDGE_FILE, TOP_AUTHORS, edges_from_projection, top_author_ids
+
+# coretweet_state.py
+# Persistent state for incremental co-retweet updates. The state holds the
+# distinct (retweeter, author) pairs (the author -> retweeter-set index), the
+# per-author retweet counts, the current top-N authors and their pair weights.
+# `update` folds a delta file of new tweets into it, touching only the pair
+# weights of retweeters that appear in the delta.
+
+
+STATE_DIR = "coretweet_state"
+DIFF_FILE = "coretweet_edges_diff.csv"
+
+
+def save_state(state, state_dir=STATE_DIR):
+    root = Path(state_dir)
+    tmp = root.with_name(root.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+
+    np.save(tmp / "pairs.npy", state["pairs"])
+    np.savez(tmp / "author_counts.npz", ids=state["author_counts"].index.to_numpy("int64"),
+             counts=state["author_counts"].to_numpy("int64"))
+    np.save(tmp / "top_ids.npy", state["top_ids"])
+    W = state["weights"].tocoo()
+    np.savez(tmp / "weights.npz", row=W.row, col=W.col, data=W.data)
+    (tmp / "meta.json").write_text(json.dumps({"top": state["top"]}))
+
+    shutil.rmtree(root, ignore_errors=True)
+    tmp.rename(root)
+
+
+def load_state(state_dir=STATE_DIR):
+    root = Path(state_dir)
+    if not (root / "meta.json").exists():
+        raise FileNotFoundError(f"No co-retweet state in {root}; run `python coretweet_state.py init` first")
+
+    counts = np.load(root / "author_counts.npz")
+    top_ids = np.load(root / "top_ids.npy")
+    w = np.load(root / "weights.npz")
+    return {
+        "pairs": np.load(root / "pairs.npy"),
+        "author_counts": pd.Series(counts["counts"], index=counts["ids"]),
+        "top_ids": top_ids,
+        "weights": sp.coo_matrix((w["data"], (w["row"], w["col"])), shape=(len(top_ids), len(top_ids))),
+        "top": json.loads((root / "meta.json").read_text())["top"],
+    }
+
+
+def sort_pairs(pairs):
+    return pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+
+
+def pairs_in(pairs, other):
+    if not len(pairs) or not len(other):
+        return np.zeros(len(pairs), dtype=bool)
+    return pd.MultiIndex.from_arrays(pairs.T).isin(pd.MultiIndex.from_arrays(other.T))
+
+
+def project_pairs(pairs, author_ids):
+    # Strict upper triangle of B^T B for distinct pairs, over the sorted author_ids
+    pairs = pairs[np.isin(pairs[:, 1], author_ids)]
+    shard = retweet_stream.shard_weights(pairs[:, 0], np.searchsorted(author_ids, pairs[:, 1]), len(author_ids))
+    return retweet_stream.merge_shards([shard], len(author_ids)).tocsr()
+
+
+def init_state(csv_file=CSV_FILE, top=TOP_AUTHORS):
+    store = retweet_stream.ingest(csv_file)
+    try:
+        pairs = np.concatenate(list(store.partitions()) or [np.empty((0, 2), dtype=np.int64)])
+    finally:
+        store.cleanup()
+    pairs = sort_pairs(pairs)
+    top_ids = np.sort(top_author_ids(store.author_counts, top))
+    return {
+        "pairs": pairs,
+        "author_counts": store.author_counts,
+        "top_ids": top_ids,
+        "weights": project_pairs(pairs, top_ids).tocoo(),
+        "top": top,
+    }
+
+
+def apply_delta(state, delta_file, top=None):
+    top = state["top"] if top is None else top
+    old_pairs, old_ids = state["pairs"], state["top_ids"]
+
+    # --- 1. Fold the new retweets into the counts and the pair index ---
+    delta = retweet_stream.ingest(delta_file)
+    author_counts = state["author_counts"].add(delta.author_counts, fill_value=0).astype("int64")
+    try:
+        delta_pairs = np.concatenate(list(delta.partitions()) or [np.empty((0, 2), dtype=np.int64)])
+    finally:
+        delta.cleanup()
+    new_pairs = delta_pairs[~pairs_in(delta_pairs, old_pairs)]
+    pairs = sort_pairs(np.concatenate([old_pairs, new_pairs]))
+
+    # --- 2. Re-evaluate top-N membership ---
+    top_ids = np.sort(top_author_ids(author_counts, top))
+    kept = np.isin(top_ids, old_ids)
+    entering = top_ids[~kept]
+
+    # --- 3. Carry over the weights between authors that stay in the top-N ---
+    old_W = state["weights"].tocoo()
+    remap = np.full(len(old_ids), -1)
+    stay = np.isin(old_ids, top_ids)
+    remap[stay] = np.searchsorted(top_ids, old_ids[stay])
+    keep = (remap[old_W.row] >= 0) & (remap[old_W.col] >= 0)
+    W = sp.coo_matrix((old_W.data[keep], (remap[old_W.row[keep]], remap[old_W.col[keep]])),
+                      shape=(len(top_ids), len(top_ids))).tocsr()
+
+    # --- 4. Bump pairs between kept authors, only for retweeters in the delta ---
+    kept_ids = top_ids[kept]
+    touched = np.isin(old_pairs[:, 0], np.unique(new_pairs[:, 0]))
+    before = project_pairs(old_pairs[touched], top_ids)
+    after = project_pairs(np.concatenate([old_pairs[touched], new_pairs]), top_ids)
+    bump = (after - before).tocoo()
+    both_kept = np.isin(top_ids[bump.row], kept_ids) & np.isin(top_ids[bump.col], kept_ids)
+    W = W + sp.coo_matrix((bump.data[both_kept], (bump.row[both_kept], bump.col[both_kept])), shape=W.shape)
+
+    # --- 5. Compute full rows for authors entering the top-N ---
+    if len(entering):
+        their_retweeters = np.unique(pairs[np.isin(pairs[:, 1], entering), 0])
+        full = project_pairs(pairs[np.isin(pairs[:, 0], their_retweeters)], top_ids).tocoo()
+        new_row = np.isin(top_ids[full.row], entering) | np.isin(top_ids[full.col], entering)
+        W = W + sp.coo_matrix((full.data[new_row], (full.row[new_row], full.col[new_row])), shape=W.shape)
+
+    W = W.tocoo()
+    W.eliminate_zeros()
+    print(f"Delta: {len(delta_pairs)} retweet pairs ({len(new_pairs)} new), "
+          f"{len(entering)} authors entered the top {top}, {len(old_ids) - stay.sum()} left")
+    return {"pairs": pairs, "author_counts": author_counts, "top_ids": top_ids, "weights": W, "top": top}
+
+
+def edges_diff(old_edges, new_edges):
+    # Edges whose weight changed, with 0 standing in for an edge that is absent
+    merged = old_edges.merge(new_edges, on=['source', 'target'], how='outer', suffixes=('_old', '_new'))
+    merged[['weight_old', 'weight_new']] = merged[['weight_old', 'weight_new']].fillna(0).astype('int64')
+    changed = merged[merged['weight_old'] != merged['weight_new']]
+    return changed.rename(columns={'weight_old': 'old_weight', 'weight_new': 'new_weight'})
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Maintain co-retweet edges incrementally")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    init = sub.add_parser("init", help="build the state from the full tweet history")
+    init.add_argument("--tweets", default=CSV_FILE)
+    init.add_argument("--top", type=int, default=TOP_AUTHORS)
+
+    update = sub.add_parser("update", help="fold a delta file of new tweets into the state")
+    update.add_argument("delta", help="CSV of new tweets, same columns as tweets.csv")
+    update.add_argument("--top", type=int, default=None, help="top-N authors (default: the stored value)")
+    update.add_argument("--diff", action="store_true", help=f"also write the changed edges to {DIFF_FILE}")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    if args.command == "init":
+        state = init_state(args.tweets, args.top)
+    else:
+        old = load_state()
+        state = apply_delta(old, args.delta, args.top)
+        if args.diff:
+            diff = edges_diff(edges_from_projection(old["weights"], old["top_ids"]),
+                              edges_from_projection(state["weights"], state["top_ids"]))
+            diff.to_csv(DIFF_FILE, index=False)
+            print(f"Wrote {len(diff)} changed edges to {DIFF_FILE}")
+
+    save_state(state)
+    edges_df = edges_from_projection(state["weights"], state["top_ids"])
+    edges_df.to_csv(EDGE_FILE, index=False)
+    write_graph(edges_df, EDGE_FILE)
+    print("done")
@@ -0,0 +1,346 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import networkx as nx
+from networkx.utils import create_random_state
+
+# force_layout.py
+# Barnes-Hut versions of networkx's forceatlas2_layout and spring_layout (3.6),
+# taking the same arguments and seeds (an int seed gives the same starting
+# positions) and, for spring_layout, the same auto / force / energy methods.
+# Each iteration builds a quadtree from Morton codes of the positions; repulsion
+# walks it level by level for all nodes at once: a cell whose width / distance is
+# below theta acts as one mass at its centre of mass, otherwise its children are
+# visited. The walk is split over threads (NumPy releases the GIL). Attraction is
+# a sparse product over the CSR adjacency, so an iteration costs O(n log n + m)
+# instead of O(n^2).
+
+
+THETA = 1.2
+MAX_DEPTH = 16
+LAYOUT_VERSION = 2  # part of the layout cache key; bump when layouts change
+
+
+def _interleave(x):
+    # Spread the low 16 bits of x to the even bit positions
+    x = x & 0xFFFF
+    x = (x | (x << 8)) & 0x00FF00FF
+    x = (x | (x << 4)) & 0x0F0F0F0F
+    x = (x | (x << 2)) & 0x33333333
+    x = (x | (x << 1)) & 0x55555555
+    return x
+
+
+class QuadTree:
+    # Every level as sorted arrays of occupied cells, with the particle range,
+    # total mass, centre of mass and (with sizes) mean size of each cell
+
+    def __init__(self, pos, mass, depth=MAX_DEPTH, size=None):
+        self.depth = depth
+        self.mass = mass
+        self.size = size
+        lo = pos.min(axis=0)
+        self.span = max(float((pos.max(axis=0) - lo).max()), 1e-12)
+        grid = np.minimum(((pos - lo) / self.span * (1 << depth)).astype(np.int64), (1 << depth) - 1)
+        codes = _interleave(grid[:, 0]) | (_interleave(grid[:, 1]) << 1)
+        self.order = np.argsort(codes, kind="stable")
+        self.codes = codes
+        sorted_codes = codes[self.order]
+        sorted_mass = mass[self.order]
+        weighted = sorted_mass[:, None] * pos[self.order]
+
+        self.levels = []
+        for level in range(depth + 1):
+            cell_codes = sorted_codes >> (2 * (depth - level))
+            start = np.flatnonzero(np.r_[True, cell_codes[1:] != cell_codes[:-1]])
+            count = np.diff(np.r_[start, len(cell_codes)])
+            m = np.add.reduceat(sorted_mass, start)
+            com = np.add.reduceat(weighted, start) / np.where(m > 0, m, 1)[:, None]
+            sizes = None if size is None else np.add.reduceat(size[self.order], start) / count
+            self.levels.append((cell_codes[start], start, count, m, com, sizes))
+
+    def forces(self, pos, targets, theta=THETA, min_dist2=1e-12, potential=False):
+        # sum_j m_j (x_i - x_j) / d_ij^2 for each target i, with d_ij shortened by
+        # both sizes when the tree has them; or sum_j m_j log d_ij with potential=True
+        out = np.zeros(len(targets) if potential else (len(targets), 2))
+        own = self.codes[targets]
+        ti = np.arange(len(targets))
+        cells = np.zeros(len(targets), dtype=np.int64)  # the root
+        for level, (cell_codes, start, count, m, com, sizes) in enumerate(self.levels):
+            if not len(ti):
+                break
+            width = self.span / (1 << level)
+            d = pos[targets[ti]] - com[cells]
+            dist2 = np.einsum("ij,ij->i", d, d)
+            inside = (own[ti] >> (2 * (self.depth - level))) == cell_codes[cells]
+            accept = ~inside & ((count[cells] == 1) | (width * width < theta * theta * dist2))
+            self._add(out, targets, ti[accept], d[accept], dist2[accept], m[cells[accept]],
+                      None if sizes is None else sizes[cells[accept]], min_dist2, potential)
+
+            # A cell holding only the target exerts nothing; the rest is opened
+            expand = ~accept & ~(inside & (count[cells] == 1))
+            ti, cells = ti[expand], cells[expand]
+            if level == self.depth:
+                self._direct(out, pos, targets, ti, start[cells], count[cells], min_dist2, potential)
+                break
+            next_codes = self.levels[level + 1][0]
+            parents = cell_codes[cells] << 2
+            first = np.searchsorted(next_codes, parents)
+            n_children = np.searchsorted(next_codes, parents + 4) - first
+            ti, cells = ti.repeat(n_children), _ranges(first, n_children)
+        return out
+
+    def _direct(self, out, pos, targets, ti, start, count, min_dist2, potential):
+        # Exact pairs for cells that still hold several particles at full depth
+        j = self.order[_ranges(start, count)]
+        ti = ti.repeat(count)
+        other = targets[ti] != j
+        ti, j = ti[other], j[other]
+        d = pos[targets[ti]] - pos[j]
+        self._add(out, targets, ti, d, np.einsum("ij,ij->i", d, d), self.mass[j],
+                  None if self.size is None else self.size[j], min_dist2, potential)
+
+    def _add(self, out, targets, ti, d, dist2, m, sizes, min_dist2, potential):
+        if potential:
+            out += np.bincount(ti, 0.5 * m * np.log(np.maximum(dist2, min_dist2)), minlength=len(out))
+            return
+        if sizes is not None:
+            dist2 = (np.sqrt(dist2) - self.size[targets[ti]] - sizes) ** 2
+        factor = m / np.maximum(dist2, min_dist2)
+        for axis in range(2):
+            out[:, axis] += np.bincount(ti, d[:, axis] * factor, minlength=len(out))
+
+
+def _ranges(first, counts):
+    # Concatenated aranges [first[k], first[k] + counts[k])
+    total = counts.sum()
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(first, counts) + offsets
+
+
+def repulsion(pos, mass, theta=THETA, workers=None, min_dist2=1e-12, size=None, potential=False):
+    # Barnes-Hut estimate of sum_j m_j (x_i - x_j) / |x_i - x_j|^2 for every node
+    # (see QuadTree.forces for sizes and the potential)
+    tree = QuadTree(pos, mass, size=size)
+    workers = workers or os.cpu_count() or 1
+    chunks = np.array_split(np.arange(len(pos)), min(workers, max(1, len(pos) // 256)))
+    if len(chunks) == 1:
+        return tree.forces(pos, chunks[0], theta, min_dist2, potential)
+    with ThreadPoolExecutor(len(chunks)) as pool:
+        parts = pool.map(lambda targets: tree.forces(pos, targets, theta, min_dist2, potential), chunks)
+        return np.concatenate(list(parts))
+
+
+def _adjacency(G, weight):
+    A = nx.to_scipy_sparse_array(G, weight=weight, dtype=np.float64, format="csr")
+    rows = np.repeat(np.arange(A.shape[0]), np.diff(A.indptr))
+    return A, rows, A.indices, A.data
+
+
+def _pull(pos, rows, cols, factor, n):
+    # sum over the adjacency of factor * (x_j - x_i) for each i
+    d = pos[cols] - pos[rows]
+    return np.column_stack([np.bincount(rows, d[:, axis] * factor, minlength=n) for axis in range(2)])
+
+
+def _store(G, pos, store_pos_as):
+    if store_pos_as is not None:
+        nx.set_node_attributes(G, pos, store_pos_as)
+    return pos
+
+
+def forceatlas2_layout(G, pos=None, *, max_iter=100, jitter_tolerance=1.0, scaling_ratio=2.0, gravity=1.0,
+                       distributed_action=False, strong_gravity=False, node_mass=None, node_size=None,
+                       weight=None, linlog=False, seed=None, dim=2, store_pos_as=None, dissuade_hubs=False,
+                       theta=THETA, workers=None):
+    # Same arguments, forces and speed control as nx.forceatlas2_layout, with
+    # Barnes-Hut repulsion. dissuade_hubs is the newer networkx name for
+    # distributed_action. With node_size, far cells repel with their mean size.
+    # Layouts in other than 2 dimensions are left to networkx.
+    distributed_action = distributed_action or dissuade_hubs
+    if dim != 2 and pos is None:
+        return nx.forceatlas2_layout(G, max_iter=max_iter, jitter_tolerance=jitter_tolerance,
+                                     scaling_ratio=scaling_ratio, gravity=gravity,
+                                     distributed_action=distributed_action, strong_gravity=strong_gravity,
+                                     node_mass=node_mass, node_size=node_size, weight=weight, linlog=linlog,
+                                     seed=seed, dim=dim, store_pos_as=store_pos_as)
+    if len(G) == 0:
+        return {}
+    seed = create_random_state(seed)
+    n = len(G)
+    if pos is None:
+        pos_arr = seed.rand(n, 2).astype(np.float32).astype(np.float64)
+    elif len(pos) == n:
+        pos_arr = np.array([pos[node] for node in G], dtype=np.float64)
+    else:
+        # Nodes without a position start at random within the given ones
+        given = np.array(list(pos.values()), dtype=np.float64)
+        lo, hi = given.min(axis=0), given.max(axis=0)
+        pos_arr = lo + seed.rand(n, 2) * (hi - lo)
+        for i, node in enumerate(G):
+            if node in pos:
+                pos_arr[i] = pos[node]
+
+    node_mass = node_mass or {}
+    mass = np.array([node_mass.get(node, G.degree(node) + 1) for node in G], dtype=np.float64)
+    # Sizes only count when given, as in networkx
+    size = None if node_size is None else np.array([node_size.get(node, 1) for node in G], dtype=np.float64)
+    A, rows, cols, w = _adjacency(G, weight)
+    def estimate_factor(swing, traction, speed, speed_efficiency):
+        opt_jitter = 0.05 * np.sqrt(n)
+        min_jitter = np.sqrt(opt_jitter)
+        jitter = jitter_tolerance * max(min_jitter, min(10, opt_jitter * traction / n**2))
+        min_speed_efficiency = 0.05
+        if swing / traction > 2.0:
+            if speed_efficiency > min_speed_efficiency:
+                speed_efficiency *= 0.5
+            jitter = max(jitter, jitter_tolerance)
+        target_speed = np.inf if swing == 0 else jitter * speed_efficiency * traction / swing
+        if swing > jitter * traction:
+            if speed_efficiency > min_speed_efficiency:
+                speed_efficiency *= 0.7
+        elif speed < 1000:
+            speed_efficiency *= 1.3
+        return speed + min(target_speed - speed, 0.5 * speed), speed_efficiency
+
+    speed = speed_efficiency = swing = traction = 1
+    for _ in range(max_iter):
+        if linlog:
+            d = np.linalg.norm(pos_arr[cols] - pos_arr[rows], axis=1)
+            attraction = _pull(pos_arr, rows, cols, w * np.log1p(d) / np.where(d > 0, d, 1), n)
+        else:
+            attraction = A @ pos_arr - A.sum(axis=1)[:, None] * pos_arr
+        if distributed_action:
+            attraction /= mass[:, None]
+
+        repulsion_ = scaling_ratio * mass[:, None] * repulsion(pos_arr, mass, theta, workers, size=size)
+
+        centered = pos_arr - pos_arr.mean(axis=0)
+        if strong_gravity:
+            gravities = -gravity * mass[:, None] * centered
+        else:
+            norm = np.linalg.norm(centered, axis=1)
+            gravities = -gravity * mass[:, None] * centered / np.where(norm > 0, norm, np.inf)[:, None]
+
+        update = attraction + repulsion_ + gravities
+        swing += (mass * np.linalg.norm(pos_arr - update, axis=1)).sum()
+        traction += (0.5 * mass * np.linalg.norm(pos_arr + update, axis=1)).sum()
+        speed, speed_efficiency = estimate_factor(swing, traction, speed, speed_efficiency)
+
+        df = np.linalg.norm(update, axis=1)
+        factor = speed / (1 + np.sqrt(speed * mass * df))
+        if size is not None:
+            # Slower, capped steps once sizes are adjusted
+            factor = np.minimum(0.1 * factor * df, 10.0) / np.where(df > 0, df, 1)
+        step = update * factor[:, None]
+        pos_arr += step
+        if abs(step).sum() < 1e-10:
+            break
+    return _store(G, dict(zip(G, pos_arr)), store_pos_as)
+
+
+def _energy(pos_arr, A, rows, cols, w, k, fixed, iterations, threshold, gravity, theta, workers):
+    # nx's "energy" method: L-BFGS on the integrated Fruchterman-Reingold forces
+    # plus gravity pulling each connected component's centroid to (0.5, 0.5).
+    # Repulsion and its log potential come from the Barnes-Hut tree.
+    from scipy.optimize import minimize
+    from scipy.sparse.csgraph import connected_components
+
+    if gravity <= 0:
+        raise ValueError("the gravity must be positive.")
+    n = len(pos_arr)
+    n_components, labels = connected_components(A, directed=False)
+    members = np.bincount(labels)
+    ones = np.ones(n)
+    w = np.abs(w)
+
+    def cost(x):
+        pos = x.reshape(n, 2)
+        d = np.maximum(np.linalg.norm(pos[cols] - pos[rows], axis=1), 1e-5)
+        grad = 2 * (k * k * -repulsion(pos, ones, theta, workers, min_dist2=1e-10) - _pull(pos, rows, cols, w * d, n) / k)
+        value = np.sum(w * d ** 3) / (3 * k)
+        value -= k * k * (repulsion(pos, ones, theta, workers, min_dist2=1e-10, potential=True).sum()
+                          + n * np.log(1e-5))
+        centers = np.zeros((n_components, 2))
+        np.add.at(centers, labels, pos)
+        offset = centers / members[:, None] - 0.5
+        grad += gravity * offset[labels]
+        value += gravity * 0.5 * np.sum(members * np.linalg.norm(offset, axis=1) ** 2)
+        grad[fixed] = 0.0
+        return value, grad.ravel()
+
+    return minimize(cost, pos_arr.ravel(), method="L-BFGS-B", jac=True,
+                    options={"maxiter": iterations, "gtol": threshold}).x.reshape(n, 2)
+
+
+def spring_layout(G, k=None, pos=None, fixed=None, iterations=50, threshold=1e-4, weight="weight", scale=1,
+                  center=None, dim=2, seed=None, store_pos_as=None, *, method="auto", gravity=1.0,
+                  theta=THETA, workers=None):
+    # Same arguments as nx.spring_layout, with Barnes-Hut repulsion. method="auto"
+    # picks "force" below 500 nodes and "energy" from there on, as networkx does:
+    # "force" is Fruchterman-Reingold with nx's cooling schedule, "energy" is
+    # L-BFGS on its energy (see _energy). Layouts in other than 2 dimensions are
+    # left to networkx.
+    if method not in ("auto", "force", "energy"):
+        raise ValueError("the method must be either auto, force, or energy.")
+    if dim != 2:
+        return nx.spring_layout(G, k, pos, fixed, iterations, threshold, weight, scale, center, dim, seed,
+                                store_pos_as, method=method, gravity=gravity)
+    if method == "auto":
+        method = "force" if len(G) < 500 else "energy"
+    center = np.zeros(2) if center is None else np.asarray(center, dtype=np.float64)
+    if len(G) == 0:
+        return {}
+    if len(G) == 1:
+        return _store(G, {next(iter(G)): center}, store_pos_as)
+    seed = create_random_state(seed)
+    n = len(G)
+    if fixed is not None:
+        if pos is None or any(node not in pos for node in fixed):
+            raise ValueError("nodes are fixed without positions given")
+        index = {node: i for i, node in enumerate(G)}
+        fixed = np.asarray([index[node] for node in fixed if node in index], dtype=np.int64)
+    if pos is None:
+        pos_arr = seed.rand(n, 2).astype(np.float32).astype(np.float64)
+        dom_size = 1
+    else:
+        dom_size = max(coord for p in pos.values() for coord in p) or 1
+        pos_arr = seed.rand(n, 2) * dom_size + center
+        for i, node in enumerate(G):
+            if node in pos:
+                pos_arr[i] = pos[node]
+
+    if k is None:
+        # Layouts held by fixed nodes need not be near 1 x 1
+        k = dom_size / np.sqrt(n) if fixed is not None else np.sqrt(1.0 / n)
+    A, rows, cols, w = _adjacency(G, weight)
+    if method == "energy":
+        pos_arr = _energy(pos_arr, A, rows, cols, w, k, [] if fixed is None else fixed, iterations, threshold,
+                          gravity, theta, workers)
+    else:
+        ones = np.ones(n)
+        t = (pos_arr.max(axis=0) - pos_arr.min(axis=0)).max() * 0.1
+        dt = t / (iterations + 1)
+        for _ in range(iterations):
+            # delta * (k^2 / d^2 - A * d / k), with distances clipped at 0.01 as networkx does
+            displacement = k * k * repulsion(pos_arr, ones, theta, workers, min_dist2=1e-4)
+            d = np.maximum(np.linalg.norm(pos_arr[cols] - pos_arr[rows], axis=1), 0.01)
+            displacement += _pull(pos_arr, rows, cols, w * d / k, n)
+
+            length = np.maximum(np.linalg.norm(displacement, axis=1), 0.01)
+            delta_pos = displacement * (t / length)[:, None]
+            if fixed is not None:
+                delta_pos[fixed] = 0.0
+            pos_arr += delta_pos
+            t -= dt
+            if np.linalg.norm(delta_pos) / n < threshold:
+                break
+
+    if fixed is None and scale is not None:
+        pos_arr -= pos_arr.mean(axis=0)
+        lim = np.abs(pos_arr).max()
+        if lim > 0:
+            pos_arr *= scale / lim
+        pos_arr += center
+    return _store(G, dict(zip(G, pos_arr)), store_pos_as)
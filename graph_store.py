@@ -0,0 +1,112 @@
+import os
+import shutil
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+# graph_store.py
+# Compact binary form of a co-retweet edge list, written next to the CSV as
+# <name>.csr/ with a sorted int64 ID table and symmetric CSR arrays
+# (int64 indptr, int32 indices, float32 weights). The arrays are loaded with
+# mmap_mode='r', so loading is near-instant and processes share the pages.
+
+
+EDGE_FILE = "coretweet_edges.csv"
+
+CSRGraph = namedtuple("CSRGraph", ["ids", "indptr", "indices", "weights"])
+
+
+def graph_path(edge_file=EDGE_FILE):
+    return Path(edge_file).with_suffix(".csr")
+
+
+def from_edges(edges_df):
+    ids, codes = np.unique(edges_df[['source', 'target']].to_numpy(np.int64).ravel(), return_inverse=True)
+    src, tgt = codes.reshape(-1, 2).T
+    w = edges_df['weight'].to_numpy(np.float32)
+    n = len(ids)
+    # Store both directions so neighbourhoods are a single slice
+    A = sp.csr_matrix((np.concatenate([w, w]), (np.concatenate([src, tgt]), np.concatenate([tgt, src]))),
+                      shape=(n, n))
+    A.sum_duplicates()
+    A.sort_indices()
+    return CSRGraph(ids, A.indptr.astype(np.int64), A.indices.astype(np.int32), A.data.astype(np.float32))
+
+
+def save_graph(graph, edge_file=EDGE_FILE):
+    root = graph_path(edge_file)
+    tmp = root.with_name(root.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    for name, array in graph._asdict().items():
+        np.save(tmp / f"{name}.npy", array)
+    shutil.rmtree(root, ignore_errors=True)
+    tmp.rename(root)
+    return root
+
+
+def write_graph(edges_df, edge_file=EDGE_FILE):
+    # Called by the edge builders right after they write the CSV
+    return save_graph(from_edges(edges_df), edge_file)
+
+
+def load_csr(edge_file=EDGE_FILE, rebuild=True):
+    # Memory-map the binary graph, (re)building it if it is missing or older than the CSV.
+    # rebuild=False is for stores saved under a name that is not an edge CSV.
+    root = graph_path(edge_file)
+    stale = rebuild and (not (root / "ids.npy").exists() or (
+        os.path.exists(edge_file) and os.path.getmtime(edge_file) > os.path.getmtime(root / "ids.npy")))
+    if stale:
+        write_graph(pd.read_csv(edge_file), edge_file)
+    return CSRGraph(*(np.load(root / f"{name}.npy", mmap_mode="r") for name in CSRGraph._fields))
+
+
+# --- Conversions ---
+
+def to_scipy(graph):
+    n = len(graph.ids)
+    return sp.csr_matrix((graph.weights, graph.indices, graph.indptr), shape=(n, n))
+
+
+def edge_arrays(graph):
+    # Each undirected edge once, as (u, v, weight) with u < v
+    rows = np.repeat(np.arange(len(graph.ids)), np.diff(graph.indptr))
+    upper = rows < graph.indices
+    return rows[upper], np.asarray(graph.indices[upper]), np.asarray(graph.weights[upper])
+
+
+def edge_frame(graph):
+    u, v, w = edge_arrays(graph)
+    return pd.DataFrame({'source': graph.ids[u], 'target': graph.ids[v], 'weight': w})
+
+
+def _python_weights(w):
+    # Co-retweet counts come back as ints, so reports print them like the CSV did
+    w = w.astype(np.float64)
+    return w.astype(np.int64).tolist() if np.array_equal(w, np.round(w)) else w.tolist()
+
+
+def to_igraph(graph, str_names=False):
+    import igraph as ig
+
+    u, v, w = edge_arrays(graph)
+    g = ig.Graph(n=len(graph.ids), edges=np.column_stack([u, v]).tolist(), directed=False)
+    g.es['weight'] = _python_weights(w)
+    g.vs['name'] = graph.ids.astype(str).tolist() if str_names else graph.ids.tolist()
+    return g
+
+
+def to_networkx(graph, str_names=True, weight='weight', distance=False):
+    # With distance=True the edge attribute holds 1 / weight, for shortest-path measures
+    import networkx as nx
+
+    u, v, w = edge_arrays(graph)
+    names = graph.ids.astype(str) if str_names else np.asarray(graph.ids)
+    values = (1.0 / w.astype(np.float64)).tolist() if distance else _python_weights(w)
+    G = nx.Graph()
+    G.add_nodes_from(names.tolist())
+    G.add_weighted_edges_from(zip(names[u].tolist(), names[v].tolist(), values), weight=weight)
+    return G
@@ -0,0 +1,91 @@
+import hashlib
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# layout_cache.py
+# Graph layouts cached on disk, keyed by a content hash of the node set, the edge
+# set (with weights), the layout function (with its module's LAYOUT_VERSION, if
+# any) and parameters. A hit returns the stored positions without running the
+# layout, so re-rendering with other colours or sizes is free. On a miss the newest layout saved under the same name is used
+# to warm-start when it shares most of the nodes: known nodes keep their old
+# positions and new ones start next to their placed neighbours.
+
+
+LAYOUT_DIR = Path("layout_cache")
+KEEP = 3  # layouts kept per name
+WARM_START_OVERLAP = 0.5
+
+
+def layout_key(G, layout, params, weight="weight"):
+    nodes = sorted(map(str, G.nodes()))
+    index = {n: i for i, n in enumerate(nodes)}
+    edges = [(index[str(u)], index[str(v)], d.get(weight, 1)) for u, v, d in G.edges(data=True)]
+    u, v, w = (np.array(c) for c in zip(*edges)) if edges else (np.zeros(0),) * 3
+    lo, hi = np.minimum(u, v).astype(np.int64), np.maximum(u, v).astype(np.int64)
+    order = np.lexsort((hi, lo))
+
+    h = hashlib.sha256()
+    h.update("\n".join(nodes).encode())
+    for array in (lo[order], hi[order], np.asarray(w, dtype=np.float64)[order]):
+        h.update(array.tobytes())
+    version = getattr(sys.modules.get(layout.__module__), "LAYOUT_VERSION", None)
+    h.update(f"{layout.__module__}.{layout.__name__}{version}{sorted(params.items())!r}".encode())
+    return h.hexdigest()[:16]
+
+
+def _order(G, names):
+    # Row of each node of G in the cached arrays
+    row = {n: i for i, n in enumerate(names.tolist())}
+    return np.array([row[str(n)] for n in G], dtype=np.int64)
+
+
+def _save(path, nodes, positions):
+    tmp = path.with_name(path.stem + ".tmp.npz")
+    np.savez(tmp, nodes=np.array(nodes), pos=positions)
+    os.replace(tmp, path)
+
+
+def warm_start(G, previous, seed=None):
+    # Initial positions from a previous layout: {node: (x, y)} for every node of G
+    old = dict(zip(previous["nodes"].tolist(), previous["pos"]))
+    rng = np.random.default_rng(seed)
+    pos = {n: old[str(n)] for n in G if str(n) in old}
+    center = np.mean(list(pos.values()), axis=0)
+    spread = np.std(list(pos.values())) * 0.05 + 1e-3
+    for n in G:
+        if n not in pos:
+            placed = [pos[m] for m in G[n] if m in pos]
+            anchor = np.mean(placed, axis=0) if placed else center
+            pos[n] = anchor + rng.normal(scale=spread, size=2)
+    return pos
+
+
+def cached_layout(G, layout, name, **params):
+    # layout is a networkx-style layout function, e.g. nx.spring_layout; params are
+    # passed through and are part of the key
+    LAYOUT_DIR.mkdir(exist_ok=True)
+    key = layout_key(G, layout, params)
+    path = LAYOUT_DIR / f"{name}-{key}.npz"
+    if path.exists():
+        print(f"Using cached {name} layout ({key})")
+        with np.load(path) as cached:
+            return {n: p for n, p in zip(G, cached["pos"][_order(G, cached["nodes"])])}
+
+    # Newest layout under this name, for the warm start
+    history = sorted(LAYOUT_DIR.glob(f"{name}-*.npz"), key=os.path.getmtime)
+    init = None
+    if history and G.number_of_nodes():
+        with np.load(history[-1]) as previous:
+            overlap = np.isin(previous["nodes"], [str(n) for n in G]).sum()
+            if overlap >= WARM_START_OVERLAP * G.number_of_nodes():
+                print(f"Warm-starting {name} layout from {history[-1].name}")
+                init = warm_start(G, dict(previous), params.get("seed"))
+
+    pos = layout(G, pos=init, **params)
+    _save(path, [str(n) for n in G], np.array([pos[n] for n in G], dtype=np.float64).reshape(-1, 2))
+    for stale in history[:max(0, len(history) + 1 - KEEP)]:
+        stale.unlink(missing_ok=True)
+    return pos
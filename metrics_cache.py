@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# metrics_cache.py
+# Computed metrics cached on disk, keyed by a content hash of the input files and
+# the metric's parameters, so re-running an analysis on unchanged data only loads
+# arrays. Each entry is one .npz of the result's arrays (DataFrames column by
+# column, with their labels). File digests are remembered by size and mtime, so
+# an unchanged input is not re-read. Entries are touched when used and the least
+# recently used are evicted once the cache grows past MAX_BYTES.
+
+
+METRICS_DIR = Path("metrics_cache")
+MAX_BYTES = 512 * 1024 * 1024
+DIGESTS_FILE = "digests.json"
+CHUNK = 1 << 20
+
+
+def file_digest(path):
+    # SHA-256 of a file's content, recomputed only when its size or mtime changed
+    path = Path(path)
+    index_file = METRICS_DIR / DIGESTS_FILE
+    index = json.loads(index_file.read_text()) if index_file.exists() else {}
+    stat = path.stat()
+    entry = index.get(str(path.resolve()))
+    if entry and entry[:2] == [stat.st_size, stat.st_mtime_ns]:
+        return entry[2]
+
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK), b""):
+            h.update(block)
+    index[str(path.resolve())] = [stat.st_size, stat.st_mtime_ns, h.hexdigest()]
+    METRICS_DIR.mkdir(exist_ok=True)
+    tmp = index_file.with_suffix(".tmp")
+    tmp.write_text(json.dumps(index))
+    os.replace(tmp, index_file)
+    return h.hexdigest()
+
+
+def metric_key(name, inputs, params):
+    h = hashlib.sha256(name.encode())
+    for path in inputs:
+        h.update(file_digest(path).encode())
+    h.update(repr(sorted(params.items())).encode())
+    return h.hexdigest()[:16]
+
+
+def _flatten(result):
+    # {field: array} for a dict of arrays, scalars and DataFrames; a frame is its
+    # index, its column labels and one array per column
+    arrays = {}
+    for field, value in result.items():
+        if isinstance(value, pd.DataFrame):
+            arrays[f"{field}/index"] = value.index.to_numpy()
+            arrays[f"{field}/index_name"] = np.asarray(value.index.name or "")
+            arrays[f"{field}/columns"] = value.columns.to_numpy()
+            for i, column in enumerate(value.columns):
+                arrays[f"{field}/{i}"] = value[column].to_numpy()
+        else:
+            arrays[field] = np.asarray(value)
+    return {k: v.astype(str) if v.dtype == object else v for k, v in arrays.items()}
+
+
+def _unflatten(arrays):
+    result, frames = {}, set()
+    for key in arrays.files:
+        field, _, part = key.partition("/")
+        if part:
+            frames.add(field)
+        else:
+            value = arrays[key]
+            result[field] = value.item() if value.ndim == 0 else value
+    for field in frames:
+        columns = arrays[f"{field}/columns"]
+        frame = pd.DataFrame({c: arrays[f"{field}/{i}"] for i, c in enumerate(columns)},
+                             index=arrays[f"{field}/index"], columns=columns)
+        frame.index.name = arrays[f"{field}/index_name"].item() or None
+        result[field] = frame
+    return result
+
+
+def evict(keep=None, max_bytes=MAX_BYTES):
+    # Drop least recently used entries until the cache fits in max_bytes
+    entries = sorted(METRICS_DIR.glob("*.npz"), key=lambda p: p.stat().st_mtime)
+    total = sum(p.stat().st_size for p in entries)
+    for path in entries:
+        if total <= max_bytes:
+            break
+        if path != keep:
+            total -= path.stat().st_size
+            path.unlink(missing_ok=True)
+
+
+def cached(name, compute, inputs=(), **params):
+    # compute() returns a dict of arrays, scalars and DataFrames; it is only
+    # called when no entry exists for these input files and params
+    key = metric_key(name, inputs, params)
+    path = METRICS_DIR / f"{name}-{key}.npz"
+    if path.exists():
+        os.utime(path)  # most recently used
+    else:
+        result = compute()
+        METRICS_DIR.mkdir(exist_ok=True)
+        tmp = path.with_name(path.stem + ".tmp.npz")
+        np.savez(tmp, **_flatten(result))
+        os.replace(tmp, path)
+        evict(keep=path)
+    # Read back on a miss too, so both return the same types
+    with np.load(path, allow_pickle=False) as arrays:
+        return _unflatten(arrays)
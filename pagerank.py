@@ -0,0 +1,158 @@
+import argparse
+import os
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.sparse.linalg import splu
+
+from backbone import edge_file
+from graph_store import load_csr
+
+# pagerank.py
+# Weighted PageRank on the CSR graph store, by power iteration or Gauss-Seidel on
+# the sparse transition matrix, in float64 or float32. Power iteration is
+# networkx's algorithm (dangling vertices spread their rank uniformly, same
+# stopping rule). Gauss-Seidel solves the equivalent linear system
+# (I - alpha P^T) x = (1 - alpha) / n, normalised once it has converged (the
+# dangling rank only scales that solution), each sweep one sparse triangular
+# solve that uses the values already updated in it. It needs fewer sweeps than
+# power iteration needs products, but splitting and factorising the matrix costs
+# more than the products it saves on these graphs, so power iteration is the
+# default and the recommended method. Both can start from the
+# last vector saved in PAGERANK_FILE, matched by vertex id (new vertices get the
+# uniform rank), so a refresh after a small change to the graph converges in a
+# few iterations instead of tens. Both also take a teleport distribution, or an
+# n x C matrix of them, one per column, iterated together as a block so C
+# personalized PageRanks share every pass over the matrix (dangling rank then
+# follows each column's teleport, as in networkx's personalization).
+
+
+PAGERANK_FILE = "coretweet_pagerank.npz"
+ALPHA = 0.85
+TOL = 1e-6
+MAX_ITER = 100
+METHODS = ("power", "gauss-seidel")
+METHOD_HELP = "power (default, recommended) or gauss-seidel (fewer but costlier sweeps; usually slower end to end)"
+DTYPES = ("float64", "float32")
+
+PageRank = namedtuple("PageRank", ["values", "iterations"])
+
+
+def transition_matrix(graph, weighted=True, dtype=np.float64):
+    # (P^T, dangling): the transposed row-stochastic transition matrix as CSR,
+    # and the mask of vertices without out-edges (their rows of P are zero)
+    n = len(graph.ids)
+    data = np.asarray(graph.weights, dtype=np.float64) if weighted else np.ones(len(graph.indices))
+    W = sp.csr_matrix((data, graph.indices, graph.indptr), shape=(n, n))
+    strength = np.asarray(W.sum(axis=1)).ravel()
+    dangling = strength == 0
+    inverse = np.divide(1.0, strength, out=np.zeros(n), where=~dangling)
+    return (sp.diags(inverse) @ W).T.tocsr().astype(dtype), dangling
+
+
+def _columns(n, teleport, start, dtype):
+    # (teleport, start) with every column summing to 1; both default to uniform
+    v = np.full(n, 1.0 / n) if teleport is None else np.asarray(teleport, dtype=np.float64)
+    x = np.full(v.shape, 1.0 / n) if start is None else np.asarray(start, dtype=np.float64)
+    return (v / v.sum(axis=0)).astype(dtype), (x / x.sum(axis=0)).astype(dtype)
+
+
+def _converged(x, last, tol):
+    # networkx's rule, for every column
+    return bool((np.abs(x - last).sum(axis=0) < x.shape[0] * tol).all())
+
+
+def power_iteration(PT, dangling, alpha=ALPHA, tol=TOL, max_iter=MAX_ITER, start=None, teleport=None):
+    v, x = _columns(PT.shape[0], teleport, start, PT.dtype)
+    for i in range(1, max_iter + 1):
+        last = x
+        x = alpha * (PT @ last) + (alpha * last[dangling].sum(axis=0) + 1 - alpha) * v
+        if _converged(x, last, tol):
+            break
+    return PageRank(x, i)
+
+
+def gauss_seidel(PT, dangling, alpha=ALPHA, tol=TOL, max_iter=MAX_ITER, start=None, teleport=None):
+    # Splits I - alpha P^T into its lower triangle (with the diagonal) and the
+    # strict upper part, solving the lower one each sweep. The lower triangle is
+    # "factorised" once by SuperLU in its natural order without pivoting, which
+    # leaves it as it is (no fill-in) but makes every sweep a compiled solve.
+    n = PT.shape[0]
+    M = alpha * PT
+    lower = (sp.identity(n, dtype=PT.dtype, format="csc") - sp.tril(M, format="csc"))
+    solve = splu(lower, permc_spec="NATURAL", diag_pivot_thresh=0, options={"SymmetricMode": True}).solve
+    upper = sp.triu(M, k=1, format="csr")
+    # Sweeps run on the unnormalised system, whose solution is the PageRank up
+    # to a per-column scale (the dangling rank only adds a multiple of v to the
+    # right-hand side); rescaling every sweep would move that fixed point
+    v, y = _columns(n, teleport, start, PT.dtype)
+    b = (1 - alpha) * v
+    x = y
+    for i in range(1, max_iter + 1):
+        last = x
+        y = solve(np.asarray(b + upper @ y)).astype(PT.dtype)
+        x = y / y.sum(axis=0)
+        if _converged(x, last, tol):
+            break
+    return PageRank(x, i)
+
+
+SOLVERS = {"power": power_iteration, "gauss-seidel": gauss_seidel}
+
+
+def pagerank(graph, alpha=ALPHA, tol=TOL, max_iter=MAX_ITER, method="power", dtype=np.float64,
+             weighted=True, start=None, teleport=None):
+    # PageRank of every vertex of the graph store, summing to 1 (per column with
+    # an n x C teleport matrix)
+    PT, dangling = transition_matrix(graph, weighted, dtype)
+    return SOLVERS[method](PT, dangling, alpha, tol, max_iter, start, teleport)
+
+
+def load_start(ids, path=PAGERANK_FILE):
+    # The saved vector reindexed to these vertex ids, or None if there is none
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as saved:
+        values = pd.Series(saved["values"], index=saved["ids"])
+    values = values[~values.index.duplicated()].reindex(np.asarray(ids))
+    return values.fillna(1.0 / len(values)).to_numpy(np.float64)
+
+
+def save_start(ids, values, path=PAGERANK_FILE):
+    tmp = Path(path).with_suffix(".tmp.npz")
+    np.savez(tmp, ids=np.asarray(ids), values=np.asarray(values, dtype=np.float64))
+    os.replace(tmp, path)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Weighted PageRank of the co-retweet graph, warm-started")
+    parser.add_argument("--edges", help="edge CSV (default: the backbone if it is up to date, else all co-retweets)")
+    parser.add_argument("--method", choices=METHODS, default="power", help=METHOD_HELP)
+    parser.add_argument("--dtype", choices=DTYPES, default="float64")
+    parser.add_argument("--alpha", type=float, default=ALPHA, help=f"damping factor (default: {ALPHA})")
+    parser.add_argument("--tol", type=float, default=TOL, help=f"per-vertex tolerance (default: {TOL})")
+    parser.add_argument("--max-iter", type=int, default=MAX_ITER)
+    parser.add_argument("--unweighted", action="store_true")
+    parser.add_argument("--cold", action="store_true", help=f"start from uniform, ignoring {PAGERANK_FILE}")
+    parser.add_argument("--output", default="coretweet_pagerank.csv")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    graph = load_csr(args.edges or edge_file())
+    start = None if args.cold else load_start(graph.ids)
+    result = pagerank(graph, args.alpha, args.tol, args.max_iter, args.method, np.dtype(args.dtype),
+                      not args.unweighted, start)
+    save_start(graph.ids, result.values)
+    pd.DataFrame({"Id": np.asarray(graph.ids), "PageRank": result.values}) \
+        .sort_values("PageRank", ascending=False).to_csv(args.output, index=False)
+    print(f"PageRank of {len(graph.ids)} nodes after {result.iterations} iterations "
+          f"({'warm' if start is not None else 'cold'} start); saved {args.output} and {PAGERANK_FILE}")
+
+
+if __name__ == "__main__":
+    main()
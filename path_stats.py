@@ -0,0 +1,134 @@
+import argparse
+from collections import namedtuple
+from statistics import NormalDist
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components, dijkstra
+
+from graph_store import load_csr
+
+# path_stats.py
+# Diameter and average path length of the giant component without all-pairs
+# breadth-first searches. The diameter comes from iFUB (Crescenzi et al. 2013):
+# a 4-sweep picks a central vertex u and a lower bound, then the vertices are
+# visited by decreasing distance from u, the eccentricities of each level raising
+# the lower bound while the upper bound falls to twice the level below; the two
+# meet after a handful of BFS on real networks. With a BFS budget the search may
+# stop early and report the bounds. The average path length is the mean of
+# per-source mean distances over sampled sources, with a normal-approximation
+# confidence interval (finite-population corrected, so zero with every source).
+# BFS run as unweighted scipy Dijkstra, many sources per call.
+
+
+EDGE_FILE = "coretweet_edges.csv"
+EXACT_NODES = 20_000  # up to this giant-component size the scripts stay exact
+SAMPLES = 500
+CONFIDENCE = 0.95
+BATCH_ENTRIES = 1 << 22  # distance-matrix entries per BFS call
+MIN_BUDGET = 5  # the 4-sweep and the BFS from its centre always run
+
+Diameter = namedtuple("Diameter", ["lower", "upper", "bfs"])
+PathLength = namedtuple("PathLength", ["mean", "error", "samples"])
+
+
+def giant_component(graph):
+    # (adjacency, vertices): the unweighted CSR matrix of the largest connected
+    # component and the graph vertices it holds
+    n = len(graph.ids)
+    A = sp.csr_matrix((np.ones(len(graph.indices)), graph.indices, graph.indptr), shape=(n, n))
+    _, labels = connected_components(A, directed=False)
+    vertices = np.flatnonzero(labels == np.bincount(labels).argmax())
+    return A[vertices][:, vertices].tocsr(), vertices
+
+
+def _bfs(A, sources, predecessors=False):
+    return dijkstra(A, indices=sources, unweighted=True, return_predecessors=predecessors)
+
+
+def _eccentricities(A, sources):
+    per_call = max(1, BATCH_ENTRIES // A.shape[0])
+    return np.concatenate([_bfs(A, sources[i:i + per_call]).max(axis=1)
+                           for i in range(0, len(sources), per_call)]).astype(np.int64)
+
+
+def _sweep(A, start):
+    # (far end a, its eccentricity, the vertex halfway along a longest path from a)
+    a = int(_bfs(A, start).argmax())
+    dist, pred = _bfs(A, a, predecessors=True)
+    b = int(dist.argmax())
+    for _ in range(int(dist[b]) // 2):
+        b = pred[b]
+    return a, int(dist.max()), int(b)
+
+
+def diameter(A, budget=None):
+    # Diameter bounds of a connected graph; lower == upper unless the BFS budget
+    # ran out first
+    if budget is not None and budget < MIN_BUDGET:
+        raise ValueError(f"the diameter search needs a budget of at least {MIN_BUDGET} BFS")
+    start = int(np.diff(A.indptr).argmax())
+    _, lower1, middle = _sweep(A, start)
+    _, lower2, centre = _sweep(A, middle)
+    lower, searches = max(lower1, lower2), 5
+
+    dist = _bfs(A, centre).astype(np.int64)
+    level = int(dist.max())
+    upper = 2 * level
+    while lower < upper:
+        fringe = np.flatnonzero(dist == level)
+        if budget is not None and searches + len(fringe) > budget:
+            break
+        lower = max(lower, int(_eccentricities(A, fringe).max()))
+        searches += len(fringe)
+        upper = min(upper, max(lower, 2 * (level - 1)))
+        level -= 1
+    return Diameter(lower, upper, searches)
+
+
+def mean_path_length(A, samples=SAMPLES, seed=None):
+    # Mean distance over ordered pairs of a connected graph from `samples` BFS
+    # sources (all of them if samples >= n)
+    n = A.shape[0]
+    k = min(n, samples)
+    sources = np.arange(n) if k == n else np.random.default_rng(seed).choice(n, size=k, replace=False)
+    per_call = max(1, BATCH_ENTRIES // n)
+    means = np.concatenate([_bfs(A, sources[i:i + per_call]).sum(axis=1) / max(n - 1, 1)
+                            for i in range(0, k, per_call)])
+    fpc = (n - k) / max(n - 1, 1)
+    z = NormalDist().inv_cdf((1 + CONFIDENCE) / 2)
+    error = z * np.sqrt(means.var(ddof=1) / k * fpc) if k > 1 else float("inf")
+    return PathLength(float(means.mean()), float(error), k)
+
+
+def bfs_budget(value):
+    # argparse type for BFS budgets
+    budget = int(value)
+    if budget < MIN_BUDGET:
+        raise argparse.ArgumentTypeError(f"must be at least {MIN_BUDGET} (the 4-sweep and its centre BFS)")
+    return budget
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Diameter and average path length of the giant component")
+    parser.add_argument("--edges", default=EDGE_FILE)
+    parser.add_argument("--samples", type=int, default=SAMPLES, help="BFS sources for the average path length")
+    parser.add_argument("--budget", type=bfs_budget,
+                        help=f"stop the diameter search after this many BFS (at least {MIN_BUDGET})")
+    parser.add_argument("--seed", type=int)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    A, vertices = giant_component(load_csr(args.edges))
+    print(f"Giant component: {len(vertices)} nodes")
+    d = diameter(A, args.budget)
+    print(f"Diameter: {d.lower}" if d.lower == d.upper else f"Diameter: between {d.lower} and {d.upper}",
+          f"({d.bfs} BFS)")
+    apl = mean_path_length(A, args.samples, args.seed)
+    print(f"Average path length: {apl.mean:.3f} ± {apl.error:.3f} ({apl.samples} sources)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import matplotlib.colors as mcolors
+
+# raster.py
+# Draws a graph straight into a NumPy pixel buffer instead of one matplotlib artist
+# per edge. Edges are sampled once per pixel along their major axis and the hits
+# added into a count per pixel (in chunks, across a few threads), which is then
+# shaded the way stacked translucent lines would be: 1 - (1 - alpha)^count. Nodes
+# are stamped as discs in drawing order. Sizes follow matplotlib's units (node
+# size in points^2, widths in points) so the scripts keep their scaling.
+
+
+CHUNK_SAMPLES = 1 << 22
+MAX_WORKERS = 4  # default thread count; each one holds a full-image buffer
+BAND_ROWS = 512
+
+
+def to_pixels(pos, width, height, margin=0.05):
+    # Fit positions into the image with a margin, y pointing up as in matplotlib
+    pos = np.asarray(pos, dtype=np.float64)
+    lo, hi = pos.min(axis=0), pos.max(axis=0)
+    span = np.where(hi > lo, hi - lo, 1.0)
+    unit = (pos - lo) / span
+    x = (margin + unit[:, 0] * (1 - 2 * margin)) * (width - 1)
+    y = (1 - margin - unit[:, 1] * (1 - 2 * margin)) * (height - 1)
+    return x, y
+
+
+def _edge_chunk(x0, y0, x1, y1, width, height, out, weights=None):
+    # Adds the chunk's hits into out in place. Per-edge values are repeated rather
+    # than gathered, and samples kept in float32, since this loop touches every sample
+    steps = np.ceil(np.maximum(np.abs(x1 - x0), np.abs(y1 - y0))).astype(np.int64) + 1
+    div = np.maximum(steps - 1, 1)
+    k = (np.arange(steps.sum()) - np.repeat(np.cumsum(steps) - steps, steps)).astype(np.float32)
+    x = np.rint(np.repeat(x0.astype(np.float32), steps) + k * np.repeat(((x1 - x0) / div).astype(np.float32), steps))
+    y = np.rint(np.repeat(y0.astype(np.float32), steps) + k * np.repeat(((y1 - y0) / div).astype(np.float32), steps))
+    del k
+    x, y = x.astype(np.int32), y.astype(np.int32)
+    inside = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+    pixels = y[inside].astype(np.int64) * width + x[inside]
+    # np.add.at takes its fast path only for an array of values, not a scalar
+    w = np.ones(len(pixels), out.dtype) if weights is None else np.repeat(weights.astype(out.dtype), steps)[inside]
+    np.add.at(out, pixels, w)
+
+
+def edge_counts(x, y, u, v, width, height, weights=None, workers=None):
+    # Number of edges crossing every pixel, or their summed weights. Each worker adds
+    # its share of the chunks into one buffer of its own, so at most `workers` chunks
+    # and image buffers are held at once
+    steps = np.ceil(np.maximum(np.abs(x[v] - x[u]), np.abs(y[v] - y[u]))) + 1
+    bounds = np.searchsorted(np.cumsum(steps), np.arange(CHUNK_SAMPLES, steps.sum(), CHUNK_SAMPLES))
+    chunks = [c for c in np.split(np.arange(len(u)), bounds) if len(c)]
+    dtype = np.int32 if weights is None else np.float32
+    workers = max(1, min(workers or min(os.cpu_count() or 1, MAX_WORKERS), len(chunks)))
+
+    def work(share):
+        out = np.zeros(width * height, dtype=dtype)
+        for c in share:
+            _edge_chunk(x[u[c]], y[u[c]], x[v[c]], y[v[c]], width, height, out,
+                        None if weights is None else weights[c])
+        return out
+
+    with ThreadPoolExecutor(workers) as pool:
+        parts = pool.map(work, [chunks[i::workers] for i in range(workers)])
+        counts = next(parts)
+        for part in parts:
+            counts += part
+    return counts.reshape(height, width)
+
+
+def _disc(radius):
+    r = int(np.ceil(radius))
+    dy, dx = np.mgrid[-r:r + 1, -r:r + 1]
+    keep = dx * dx + dy * dy <= radius * radius + 0.25
+    return dy[keep], dx[keep]
+
+
+def node_owner(x, y, radii, width, height):
+    # Index of the node drawn on top at every pixel (-1 where there is none);
+    # later nodes are drawn over earlier ones
+    owner = np.full(width * height, -1, dtype=np.int64)
+    if not len(x):
+        return owner.reshape(height, width)
+    pixels, order = [], []
+    radii = np.broadcast_to(radii, x.shape)
+    cx, cy = np.rint(x).astype(np.int64), np.rint(y).astype(np.int64)
+    for r in np.unique(np.round(radii * 2) / 2):
+        nodes = np.flatnonzero(np.round(radii * 2) / 2 == r)
+        dy, dx = _disc(max(r, 0.5))
+        px, py = cx[nodes, None] + dx, cy[nodes, None] + dy
+        inside = (px >= 0) & (px < width) & (py >= 0) & (py < height)
+        pixels.append((py * width + px)[inside])
+        order.append(np.broadcast_to(nodes[:, None], px.shape)[inside])
+    pixels, order = np.concatenate(pixels), np.concatenate(order)
+
+    s = np.lexsort((order, pixels))
+    pixels, order = pixels[s], order[s]
+    last = np.r_[pixels[1:] != pixels[:-1], True]
+    owner[pixels[last]] = order[last]
+    return owner.reshape(height, width)
+
+
+def spread(counts, width_px):
+    # Lines wider than a pixel: every hit covers the line width around it
+    size = int(round(width_px))
+    if size < 2:
+        return counts
+    from scipy.ndimage import maximum_filter
+    return maximum_filter(counts, size=size)
+
+
+def render(pos, u, v, width, height, node_colors='tab:blue', node_sizes=20, dpi=100, edge_color='black',
+           edge_alpha=0.3, edge_width=1.0, node_alpha=1.0, outline_color=None, outline_width=0.0,
+           background='white', margin=0.05, edge_weights=None, counts=None, workers=None):
+    # RGB uint8 image of the graph; pos is an (n, 2) array, (u, v) the edge endpoints.
+    # edge_width is one width or one per edge; edge_weights scale how much each edge
+    # darkens a pixel (1 = one plain edge). counts from an earlier edge_counts() at
+    # the same size skips the edge pass (with a single edge_width).
+    n = len(pos)
+    points = dpi / 72.0
+    x, y = to_pixels(pos, width, height, margin)
+    u, v = np.asarray(u), np.asarray(v)
+    widths = np.asarray(edge_width, dtype=np.float64) * points
+    weights = None if edge_weights is None else np.asarray(edge_weights, dtype=np.float64)
+    if counts is not None:
+        counts = spread(counts, widths.max(initial=0))
+    elif widths.ndim == 0:
+        counts = spread(edge_counts(x, y, u, v, width, height, weights, workers), widths)
+    else:
+        # One pass per distinct pixel width
+        sizes = np.maximum(np.rint(widths), 1)
+        counts = np.zeros((height, width), dtype=np.int32 if weights is None else np.float32)
+        for size in np.unique(sizes):
+            e = np.flatnonzero(sizes == size)
+            counts = counts + spread(edge_counts(x, y, u[e], v[e], width, height,
+                                                 None if weights is None else weights[e], workers), size)
+
+    radii = np.sqrt(np.broadcast_to(np.asarray(node_sizes, dtype=np.float64), (n,))) * points / 2
+    fills = mcolors.to_rgba_array(node_colors)
+    fills = np.broadcast_to(fills, (n, 4)) if len(fills) == 1 else fills
+    if outline_color is not None and outline_width > 0:
+        # Each node as an outline disc with the fill disc on top
+        ring = outline_width * points
+        x, y = np.repeat(x, 2), np.repeat(y, 2)
+        radii = np.column_stack([radii + ring, radii]).ravel()
+        fills = np.stack([np.broadcast_to(mcolors.to_rgba(outline_color), (n, 4)), fills], axis=1).reshape(-1, 4)
+    owner = node_owner(x, y, radii, width, height)
+
+    # Coverage of one line crossing a pixel
+    coverage = edge_alpha * min(widths.max(initial=0), 1.0)
+    edge_rgb = np.array(mcolors.to_rgb(edge_color), dtype=np.float32)
+    image = np.empty((height, width, 3), dtype=np.uint8)
+    base = np.array(mcolors.to_rgb(background), dtype=np.float32)
+    for r0 in range(0, height, BAND_ROWS):
+        band = slice(r0, r0 + BAND_ROWS)
+        alpha = (1 - (1 - coverage) ** counts[band].astype(np.float32))[..., None]
+        rgb = base * (1 - alpha) + edge_rgb * alpha
+        drawn = owner[band] >= 0
+        color = fills[owner[band][drawn]]
+        a = (color[:, 3] * node_alpha)[:, None].astype(np.float32)
+        rgb[drawn] = rgb[drawn] * (1 - a) + color[:, :3] * a
+        image[band] = np.clip(rgb * 255 + 0.5, 0, 255).astype(np.uint8)
+    return image
+
+
+def save_image(image, path, dpi=100, title=None, legend=None, legend_title=None, labels=None, fontsize=None):
+    # Write the buffer as-is, or, for a title / legend / labels, as the only image
+    # artist of a figure of the same pixel size
+    import matplotlib.pyplot as plt
+
+    if title is None and legend is None and not labels:
+        plt.imsave(path, image)
+        return
+    height, width = image.shape[:2]
+    fig = plt.figure(figsize=(width / dpi, height / dpi), dpi=dpi)
+    ax = fig.add_axes((0, 0, 1, 1))
+    ax.imshow(image, interpolation="nearest")
+    ax.axis("off")
+    for px, py, text in labels or []:
+        ax.text(px, py, text, fontsize=8, ha="center", va="center")
+    if title:
+        ax.set_title(title, fontsize=fontsize, y=1 - 0.02, va="top")
+    if legend:
+        ax.legend(handles=legend, loc="upper right", title=legend_title)
+    fig.savefig(path, dpi=dpi)
+    plt.close(fig)
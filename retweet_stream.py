@@ -0,0 +1,198 @@
+import os
+import shutil
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+import tweet_cache
+
+
+CSV_FILE = "tweets.csv"
+CHUNK_SIZE = 250_000
+# Bytes of buffered (retweeter, author) pairs kept in RAM before spilling to disk
+MEMORY_LIMIT = 256 * 1024 ** 2
+N_PARTITIONS = 16
+SPILL_DIR = "retweet_spill"
+
+ID_COLUMNS = {"id": "Int64", "author_id": "Int64", "retweet_author_id": "Int64"}
+
+
+def tweet_columns(csv_file=CSV_FILE):
+    if tweet_cache.is_fresh(csv_file):
+        return tweet_cache.column_names(csv_file)
+    return list(pd.read_csv(csv_file, nrows=0).columns)
+
+
+def iter_tweet_chunks(columns, csv_file=CSV_FILE, chunksize=CHUNK_SIZE, retweets_only=False):
+    # Stream tweets.csv keeping only the requested columns, and only retweets if asked.
+    # A fresh columnar cache (see tweet_cache.py) is mapped instead of parsing the CSV.
+    if tweet_cache.is_fresh(csv_file):
+        yield from tweet_cache.iter_chunks(list(columns), chunksize, retweets_only=retweets_only, csv_file=csv_file)
+        return
+
+    use_cols = set(columns) | ({"reference_type"} if retweets_only else set())
+    dtypes = {c: t for c, t in ID_COLUMNS.items() if c in use_cols}
+    reader = pd.read_csv(csv_file, usecols=lambda c: c in use_cols, dtype=dtypes,
+                         chunksize=chunksize, low_memory=False)
+    for chunk in reader:
+        if retweets_only:
+            chunk = chunk[chunk["reference_type"] == "retweeted"]
+        if len(chunk):
+            yield chunk[list(columns)]
+
+
+def iter_retweet_chunks(columns, csv_file=CSV_FILE, chunksize=CHUNK_SIZE):
+    yield from iter_tweet_chunks(columns, csv_file, chunksize, retweets_only=True)
+
+
+def partition_of(retweeters, n_partitions):
+    # Fibonacci hashing spreads sequential or clustered IDs evenly over partitions
+    mixed = retweeters.astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+    return ((mixed >> np.uint64(32)) % np.uint64(n_partitions)).astype(np.int64)
+
+
+def unique_pairs(pairs):
+    return np.unique(pairs, axis=0) if len(pairs) else pairs
+
+
+def shard_weights(retweeters, a_codes, n_authors):
+    # Upper-triangular co-retweet counts for one shard of retweets, keyed by author code
+    r_codes, _ = pd.factorize(retweeters)
+    B = sp.csr_matrix((np.ones(len(r_codes), dtype=np.int64), (r_codes, a_codes)),
+                      shape=(r_codes.max() + 1 if len(r_codes) else 0, n_authors))
+    B.data[:] = 1
+    W = sp.triu(B.T @ B, k=1).tocoo()
+    return W.row.astype(np.int32), W.col.astype(np.int32), W.data
+
+
+def merge_shards(shards, n_authors):
+    # Reduce step: duplicate (row, col) keys from different shards are summed
+    rows, cols, data = (np.concatenate(parts) for parts in zip(*shards)) if shards else ([], [], [])
+    W = sp.coo_matrix((data, (rows, cols)), shape=(n_authors, n_authors), dtype=np.int64)
+    W.sum_duplicates()
+    return W
+
+
+def map_shards(tasks, workers):
+    # Run shard_weights over (retweeters, a_codes, n_authors) tasks, serially or in a
+    # process pool with at most 2 * workers shards in flight to bound memory
+    if workers <= 1:
+        return [shard_weights(*task) for task in tasks]
+
+    results, pending = [], set()
+    with ProcessPoolExecutor(workers) as pool:
+        for task in tasks:
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                results.extend(f.result() for f in done)
+            pending.add(pool.submit(shard_weights, *task))
+        results.extend(f.result() for f in wait(pending)[0])
+    return results
+
+
+class RetweetPairStore:
+    # Incrementally collects the distinct (retweeter, author) pairs and per-author
+    # retweet counts. Once the buffered pairs exceed memory_limit bytes they are
+    # hash-partitioned by retweeter and spilled to disk, so every retweeter's
+    # authors always end up in the same partition.
+
+    def __init__(self, memory_limit=MEMORY_LIMIT, n_partitions=N_PARTITIONS, spill_dir=SPILL_DIR, counter=None):
+        self.memory_limit = memory_limit
+        self.n_partitions = n_partitions
+        self.spill_dir = Path(spill_dir)
+        # Per-author retweet counts; an approximate counter from top_authors.py can be
+        # passed in when even the distinct authors are too many to count exactly
+        self.counter = counter
+        self._author_counts = pd.Series(dtype="int64")
+        self._buffer = []
+        self._buffered_bytes = 0
+        self._spills = 0
+
+    @property
+    def spilled(self):
+        return self._spills > 0
+
+    @property
+    def author_counts(self):
+        return self.counter.counts if self.counter is not None else self._author_counts
+
+    def add(self, retweeters, authors):
+        counts = pd.Series(authors).value_counts()
+        if self.counter is not None:
+            self.counter.update(counts)
+        else:
+            self._author_counts = self._author_counts.add(counts, fill_value=0).astype("int64")
+
+        pairs = unique_pairs(np.column_stack([retweeters, authors]).astype(np.int64))
+        self._buffer.append(pairs)
+        self._buffered_bytes += pairs.nbytes
+        if self._buffered_bytes > self.memory_limit:
+            self._spill()
+
+    def _spill(self):
+        pairs = unique_pairs(np.concatenate(self._buffer))
+        self._buffer, self._buffered_bytes = [], 0
+        if self._spills == 0:
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+            self.spill_dir.mkdir(parents=True)
+
+        parts = partition_of(pairs[:, 0], self.n_partitions)
+        for p in range(self.n_partitions):
+            np.save(self.spill_dir / f"part-{p:03d}-{self._spills:05d}.npy", pairs[parts == p])
+        self._spills += 1
+
+    def partitions(self, split=1):
+        # Yield the distinct (retweeter, author) pairs one partition at a time; pairs
+        # still in memory are hash-split by retweeter into `split` partitions
+        if not self.spilled:
+            if self._buffer:
+                pairs = unique_pairs(np.concatenate(self._buffer))
+                parts = partition_of(pairs[:, 0], split)
+                for p in range(split):
+                    yield pairs[parts == p] if split > 1 else pairs
+            return
+
+        if self._buffer:
+            self._spill()
+        for p in range(self.n_partitions):
+            files = sorted(self.spill_dir.glob(f"part-{p:03d}-*.npy"))
+            yield unique_pairs(np.concatenate([np.load(f) for f in files]))
+
+    def groups(self, authors=None):
+        # author -> array of distinct retweeters, optionally for a subset of authors
+        chunks = []
+        for pairs in self.partitions():
+            if authors is not None:
+                pairs = pairs[np.isin(pairs[:, 1], authors)]
+            chunks.append(pairs)
+        pairs = np.concatenate(chunks) if chunks else np.empty((0, 2), dtype=np.int64)
+        return pd.Series(pairs[:, 0]).groupby(pairs[:, 1]).apply(np.asarray)
+
+    def coretweet_weights(self, author_ids, workers=1):
+        # Sum the B^T B projection of every partition over the sorted author_ids; the
+        # in-memory pairs are split into one shard per worker (spilled ones come in
+        # n_partitions shards, see ingest)
+        author_ids = np.sort(np.asarray(author_ids, dtype=np.int64))
+
+        def tasks():
+            for pairs in self.partitions(max(workers, 1)):
+                pairs = pairs[np.isin(pairs[:, 1], author_ids)]
+                if len(pairs):
+                    yield pairs[:, 0], np.searchsorted(author_ids, pairs[:, 1]), len(author_ids)
+
+        return merge_shards(map_shards(tasks(), workers), len(author_ids)), author_ids
+
+    def cleanup(self):
+        if self.spilled and os.path.isdir(self.spill_dir):
+            shutil.rmtree(self.spill_dir)
+
+
+def ingest(csv_file=CSV_FILE, memory_limit=MEMORY_LIMIT, chunksize=CHUNK_SIZE, counter=None,
+           n_partitions=N_PARTITIONS):
+    store = RetweetPairStore(memory_limit=memory_limit, n_partitions=n_partitions, counter=counter)
+    for chunk in iter_retweet_chunks(["author_id", "retweet_author_id"], csv_file, chunksize):
+        store.add(chunk["author_id"].to_numpy("int64"), chunk["retweet_author_id"].to_numpy("int64"))
+    return store
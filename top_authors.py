@@ -0,0 +1,109 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from retweet_stream import CSV_FILE, iter_retweet_chunks
+
+# top_authors.py
+# Heavy-hitter selection of the most retweeted authors. Counting is one
+# vectorised pass over the retweet chunks; no per-author retweeter lists are
+# built until the winners are known.
+
+
+TOP_FILE = "top_authors.csv"
+TOP_K = 1500
+
+
+def rank(counts, k=None):
+    # Rank by count, breaking ties on the author ID so runs are reproducible
+    ranked = counts.sort_index().sort_values(ascending=False, kind="stable")
+    return ranked if k is None else ranked.head(k)
+
+
+class ExactCounter:
+    # Exact retweets per author, accumulated chunk by chunk
+
+    def __init__(self):
+        self.counts = pd.Series(dtype="int64")
+
+    def update(self, chunk_counts):
+        self.counts = self.counts.add(chunk_counts, fill_value=0).astype("int64")
+
+    def top(self, k):
+        return rank(self.counts, k)
+
+
+class SpaceSaving(ExactCounter):
+    # Space-Saving summary that monitors at most `capacity` authors. Each chunk's
+    # exact counts are merged into the summary: an author that was not monitored
+    # inherits the summary's minimum count as both count and error, and only the
+    # `capacity` largest counts are kept. Counts are over-estimates by at most
+    # `error`, and every author with more than N / capacity retweets is retained.
+
+    def __init__(self, capacity):
+        super().__init__()
+        self.capacity = capacity
+        self.errors = pd.Series(dtype="int64")
+
+    def update(self, chunk_counts):
+        full = len(self.counts) >= self.capacity
+        floor = int(self.counts.min()) if full else 0
+
+        unseen = chunk_counts.index.difference(self.counts.index)
+        inherited = pd.Series(floor, index=unseen, dtype="int64")
+        counts = self.counts.add(chunk_counts, fill_value=0).add(inherited, fill_value=0).astype("int64")
+        errors = self.errors.reindex(counts.index, fill_value=0).add(inherited, fill_value=0).astype("int64")
+
+        if len(counts) > self.capacity:
+            keep = np.argsort(-counts.to_numpy(), kind="stable")[:self.capacity]
+            counts, errors = counts.iloc[keep], errors.iloc[keep]
+        self.counts, self.errors = counts, errors
+
+    def guaranteed(self, k):
+        # Winners whose lower bound (count - error) beats the (k+1)-th count
+        top = self.top(None)
+        cutoff = top.iloc[k] if len(top) > k else 0
+        lower = top.head(k) - self.errors.reindex(top.head(k).index)
+        return lower[lower > cutoff].index.to_numpy("int64")
+
+
+def count_authors(counter, csv_file=CSV_FILE):
+    for chunk in iter_retweet_chunks(["retweet_author_id"], csv_file):
+        counter.update(chunk["retweet_author_id"].value_counts())
+    return counter
+
+
+def winner_retweeters(author_ids, csv_file=CSV_FILE):
+    # Second pass: author -> list of retweeters, built for the winners only
+    author_ids = np.asarray(author_ids, dtype=np.int64)
+    parts = [
+        chunk[chunk["retweet_author_id"].isin(author_ids)]
+        for chunk in iter_retweet_chunks(["author_id", "retweet_author_id"], csv_file)
+    ]
+    df = pd.concat(parts, ignore_index=True)
+    return df.groupby("retweet_author_id")["author_id"].apply(list).reindex(author_ids)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Find the most retweeted authors in tweets.csv")
+    parser.add_argument("--top", type=int, default=TOP_K, help=f"number of authors to keep (default: {TOP_K})")
+    parser.add_argument("--approx", action="store_true",
+                        help="use a bounded Space-Saving summary instead of exact counts")
+    parser.add_argument("--capacity", type=int, default=None,
+                        help="authors monitored by --approx (default: 10 * K)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    counter = SpaceSaving(args.capacity or 10 * args.top) if args.approx else ExactCounter()
+    count_authors(counter)
+    top = counter.top(args.top).rename("retweets").rename_axis("author_id").reset_index()
+    if args.approx:
+        top["error"] = counter.errors.reindex(top["author_id"]).to_numpy()
+        print(f"{len(counter.guaranteed(args.top))} of the top {args.top} are guaranteed winners")
+
+    top.to_csv(TOP_FILE, index=False)
+    print(f"Saved the top {len(top)} authors to {TOP_FILE}")
@@ -0,0 +1,228 @@
+import json
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# tweet_cache.py
+# One-time conversion of tweets.csv into a directory of memory-mapped column files.
+# 64-bit IDs and counts are stored as int64 with a validity mask, low-cardinality
+# strings as int32 dictionary codes, timestamps as datetime64[ms] and free text as
+# UTF-8 bytes plus offsets. Loading a column maps the file instead of parsing text.
+
+
+CSV_FILE = "tweets.csv"
+CACHE_DIR = "tweets_cache"
+CHUNK_SIZE = 250_000
+
+CATEGORY_COLUMNS = {"reference_type", "retweeted_screen_name"}
+TIME_COLUMNS = {"created_at"}
+
+
+def column_kind(name):
+    if name in CATEGORY_COLUMNS:
+        return "category"
+    if name in TIME_COLUMNS:
+        return "time"
+    if name == "id" or name.endswith("_id") or name.endswith("_count"):
+        return "int"
+    return "text"
+
+
+def cache_path(csv_file=CSV_FILE, cache_dir=CACHE_DIR):
+    return Path(csv_file).parent / cache_dir
+
+
+def is_fresh(csv_file=CSV_FILE, cache_dir=CACHE_DIR):
+    manifest = cache_path(csv_file, cache_dir) / "manifest.json"
+    if not manifest.exists():
+        return False
+    # The cache directory is shared, so make sure it was built from this file
+    source = json.loads(manifest.read_text())["source"]
+    if Path(source["file"]).name != Path(csv_file).name:
+        return False
+    if not os.path.exists(csv_file):
+        return True
+    stat = os.stat(csv_file)
+    return source["size"] == stat.st_size and source["mtime"] == stat.st_mtime
+
+
+# --- Building the cache ---
+
+class _ColumnWriter:
+    def __init__(self, root, name):
+        self.name = name
+        self.kind = column_kind(name)
+        self.files = {}
+        self.categories = {}
+        self.text_bytes = 0
+        self._open(root, "values" if self.kind != "text" else "data")
+        if self.kind in ("int", "text"):
+            self._open(root, "valid")
+        if self.kind == "text":
+            self._open(root, "offsets")
+            self.files["offsets"].write(np.zeros(1, dtype=np.int64).tobytes())
+
+    def _open(self, root, part):
+        self.files[part] = open(root / f"{self.name}.{part}.bin", "wb")
+
+    def write(self, series):
+        if self.kind == "int":
+            # Nullable parsing keeps 19-digit IDs exact instead of rounding through float64
+            values = pd.to_numeric(series, errors="coerce", dtype_backend="numpy_nullable").astype("Int64")
+            self.files["values"].write(values.fillna(0).to_numpy("int64").tobytes())
+            self.files["valid"].write(values.notna().to_numpy().tobytes())
+        elif self.kind == "category":
+            # Only the chunk's distinct values go through the dictionary; the trailing
+            # -1 is what a missing value (chunk code -1) looks up
+            chunk_codes, uniques = pd.factorize(series)
+            lookup = np.fromiter((self.categories.setdefault(str(value), len(self.categories)) for value in uniques),
+                                 dtype=np.int32, count=len(uniques))
+            codes = np.append(lookup, np.int32(-1))[chunk_codes]
+            self.files["values"].write(codes.tobytes())
+        elif self.kind == "time":
+            times = pd.to_datetime(series, errors="coerce", utc=True).astype("datetime64[ms, UTC]")
+            self.files["values"].write(times.array.asi8.tobytes())
+        else:
+            present = series.notna().to_numpy()
+            encoded = [s.encode("utf-8") if ok else b"" for s, ok in zip(series.astype(str), present)]
+            lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded))
+            offsets = self.text_bytes + np.cumsum(lengths)
+            self.text_bytes = int(offsets[-1]) if len(offsets) else self.text_bytes
+            self.files["data"].write(b"".join(encoded))
+            self.files["offsets"].write(offsets.tobytes())
+            self.files["valid"].write(present.tobytes())
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+        spec = {"kind": self.kind}
+        if self.kind == "category":
+            spec["categories"] = list(self.categories)
+        return spec
+
+
+def build_cache(csv_file=CSV_FILE, cache_dir=CACHE_DIR, chunksize=CHUNK_SIZE):
+    root = cache_path(csv_file, cache_dir)
+    tmp = root.with_name(root.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+
+    columns = pd.read_csv(csv_file, nrows=0).columns
+    writers = [_ColumnWriter(tmp, c) for c in columns]
+    rows = 0
+    # Read everything as text and let each writer do its own typed conversion
+    for chunk in pd.read_csv(csv_file, dtype=str, chunksize=chunksize, keep_default_na=True):
+        for w in writers:
+            w.write(chunk[w.name])
+        rows += len(chunk)
+        print(f"  cached {rows} rows", end="\r")
+
+    stat = os.stat(csv_file)
+    manifest = {
+        "rows": rows,
+        "source": {"file": str(csv_file), "size": stat.st_size, "mtime": stat.st_mtime},
+        "columns": {w.name: w.close() for w in writers},
+    }
+    (tmp / "manifest.json").write_text(json.dumps(manifest))
+
+    shutil.rmtree(root, ignore_errors=True)
+    tmp.rename(root)
+    print(f"\nCached {rows} rows x {len(columns)} columns to {root}")
+    return root
+
+
+# --- Reading the cache ---
+
+def _manifest(root):
+    return json.loads((root / "manifest.json").read_text())
+
+
+def _map(root, name, part, dtype):
+    path = root / f"{name}.{part}.bin"
+    if path.stat().st_size == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r")
+
+
+def _column(root, name, spec, rows):
+    kind = spec["kind"]
+    if kind == "int":
+        values = _map(root, name, "values", np.int64)[rows]
+        mask = ~_map(root, name, "valid", np.bool_)[rows]
+        return pd.arrays.IntegerArray(np.asarray(values), np.asarray(mask))
+    if kind == "category":
+        codes = _map(root, name, "values", np.int32)[rows]
+        return pd.Categorical.from_codes(codes, categories=spec["categories"])
+    if kind == "time":
+        values = _map(root, name, "values", np.int64)[rows]
+        return pd.DatetimeIndex(np.asarray(values).view("datetime64[ms]"), tz="UTC")
+
+    data = _map(root, name, "data", np.uint8)
+    offsets = _map(root, name, "offsets", np.int64)
+    valid = _map(root, name, "valid", np.bool_)
+    idx = np.arange(len(valid))[rows]
+    if not len(idx):
+        return pd.array([], dtype="string")
+    # Copy out only the byte range covering the requested rows
+    base = int(offsets[idx.min()])
+    raw = data[base:int(offsets[idx.max() + 1])].tobytes()
+    starts, ends = offsets[idx] - base, offsets[idx + 1] - base
+    return pd.array(
+        [raw[s:e].decode("utf-8") if ok else None for s, e, ok in zip(starts, ends, valid[idx])],
+        dtype="string",
+    )
+
+
+def format_time(times):
+    # Render cached timestamps the way tweets.csv spells them (2021-03-01T21:04:15.000Z)
+    if not pd.api.types.is_datetime64_any_dtype(times):
+        return times
+    return times.dt.strftime("%Y-%m-%dT%H:%M:%S.%f").str[:-3] + "Z"
+
+
+def column_names(csv_file=CSV_FILE, cache_dir=CACHE_DIR):
+    return list(_manifest(cache_path(csv_file, cache_dir))["columns"])
+
+
+def num_rows(csv_file=CSV_FILE, cache_dir=CACHE_DIR):
+    return _manifest(cache_path(csv_file, cache_dir))["rows"]
+
+
+def load_columns(columns, rows=slice(None), csv_file=CSV_FILE, cache_dir=CACHE_DIR):
+    # Map just the requested columns; numeric, dictionary and time columns are
+    # views onto the cache files until they are sliced or modified
+    root = cache_path(csv_file, cache_dir)
+    specs = _manifest(root)["columns"]
+    missing = [c for c in columns if c not in specs]
+    if missing:
+        raise KeyError(f"Columns not in tweet cache: {missing}")
+    return pd.DataFrame({c: _column(root, c, specs[c], rows) for c in columns}, copy=False)
+
+
+def retweet_rows(csv_file=CSV_FILE, cache_dir=CACHE_DIR):
+    # Row numbers of retweets, found from the dictionary codes without decoding strings
+    root = cache_path(csv_file, cache_dir)
+    categories = _manifest(root)["columns"]["reference_type"]["categories"]
+    if "retweeted" not in categories:
+        return np.empty(0, dtype=np.int64)
+    codes = _map(root, "reference_type", "values", np.int32)
+    return np.flatnonzero(codes == categories.index("retweeted"))
+
+
+def iter_chunks(columns, chunksize=CHUNK_SIZE, retweets_only=False, csv_file=CSV_FILE, cache_dir=CACHE_DIR):
+    if retweets_only:
+        rows = retweet_rows(csv_file, cache_dir)
+        for start in range(0, len(rows), chunksize):
+            yield load_columns(columns, rows[start:start + chunksize], csv_file, cache_dir)
+        return
+
+    total = num_rows(csv_file, cache_dir)
+    for start in range(0, total, chunksize):
+        yield load_columns(columns, slice(start, start + chunksize), csv_file, cache_dir)
+
+
+if __name__ == "__main__":
+    build_cache()
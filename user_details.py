@@ -0,0 +1,82 @@
+import pandas as pd
+
+from retweet_stream import CSV_FILE, iter_tweet_chunks, tweet_columns
+from tweet_cache import format_time
+
+# user_details.py
+# Single pass over tweets.csv that collects, for the graph's node IDs only:
+#  - the details of each author's most retweeted tweet (running arg-max of retweet_count)
+#  - the author's own profile location from their most recent tweet
+# and writes both the details and the Location-augmented "more_details" CSVs.
+
+
+DETAILS_FILE = "coretweet_nodes_with_communities_and_details.csv"
+MORE_DETAILS_FILE = "coretweet_nodes_with_communities_and_more_details.csv"
+LOCATION_COLUMN = "location"
+
+DETAIL_COLUMNS = ['retweet_author_id', 'retweet_count', 'retweeted_screen_name', 'text', 'created_at']
+
+
+def keep_max(running, frame, key, value):
+    # Fold frame into the running table of one row per key with the largest
+    # value; earlier rows win ties
+    frame = frame.dropna(subset=[value])
+    if running is not None:
+        frame = pd.concat([running, frame], ignore_index=True)
+    return frame.loc[frame.groupby(key, sort=False)[value].idxmax()].reset_index(drop=True)
+
+
+def extract_details(node_ids, csv_file=CSV_FILE):
+    node_ids = pd.Index(node_ids).astype('int64')
+    has_location = LOCATION_COLUMN in tweet_columns(csv_file)
+    columns = ['author_id', 'reference_type'] + DETAIL_COLUMNS + ([LOCATION_COLUMN] if has_location else [])
+
+    best, locations = None, None
+    for chunk in iter_tweet_chunks(columns, csv_file):
+        # Running arg-max of retweet_count over the retweets of our nodes
+        retweets = chunk[(chunk['reference_type'] == 'retweeted') & chunk['retweet_author_id'].isin(node_ids)]
+        if len(retweets):
+            best = keep_max(best, retweets[DETAIL_COLUMNS], 'retweet_author_id', 'retweet_count')
+
+        # Most recent location the node reported on its own tweets
+        if has_location:
+            own = chunk[chunk['author_id'].isin(node_ids) & chunk[LOCATION_COLUMN].notna()]
+            if len(own):
+                own = own[['author_id', 'created_at', LOCATION_COLUMN]].assign(
+                    created_at=pd.to_datetime(own['created_at'], utc=True))
+                locations = keep_max(locations, own, 'author_id', 'created_at')
+
+    if not has_location:
+        print(f"Warning: tweets have no '{LOCATION_COLUMN}' column; Location will be empty.")
+    if best is None:
+        best = pd.DataFrame(columns=DETAIL_COLUMNS)
+    if locations is None:
+        locations = pd.DataFrame(columns=['author_id', 'created_at', LOCATION_COLUMN])
+
+    details = best.rename(columns={
+        'retweet_author_id': 'Id',
+        'text': 'Text',
+        'created_at': 'Time'
+    }).drop(columns='retweet_count')
+    details['Id'] = details['Id'].astype('int64')
+    details['Time'] = format_time(details['Time'])
+    location = locations.set_index('author_id')[LOCATION_COLUMN].rename('Location')
+    location.index = location.index.astype('int64')
+    return details, location
+
+
+def write_details(nodes_df, csv_file=CSV_FILE):
+    # nodes_df holds Id and Community; writes both detail CSVs and returns the richer one
+    details, location = extract_details(nodes_df['Id'], csv_file)
+
+    output_df = nodes_df.astype({'Id': 'int64'}).merge(details, on='Id', how='left')
+    output_df.to_csv(DETAILS_FILE, index=False)
+
+    output_df['Location'] = output_df['Id'].map(location)
+    output_df.to_csv(MORE_DETAILS_FILE, index=False)
+    print(f"Saved user details to {DETAILS_FILE} and {MORE_DETAILS_FILE}")
+    return output_df
+
+
+if __name__ == "__main__":
+    write_details(pd.read_csv("coretweet_nodes_with_communities.csv"))